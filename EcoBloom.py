@@ -1,15 +1,134 @@
-from flask import Flask, render_template, jsonify, request
-import json
+from flask import Flask, g, render_template, jsonify, request, send_file, stream_with_context
+import hmac
+import math
 import os
-from datetime import datetime
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from bulk import IMPORT_CHUNK_SIZE, export_lines, import_lines, validate_fields, validate_record
+from change_feed import ChangeFeed
+from facets import FACETS, FacetIndex, iter_ids, popcount
+from garden_store import DEFAULT_USER, GardenStore, migrate_shared_garden, valid_user_id
+from image_cache import DEFAULT_IMAGE_SIZE, IMAGE_SIZES, ImageCache, image_type, placeholder_svg
+import json_provider
+import metrics
+import profiler
+from plant_store import EDITABLE_FIELDS, PlantStore, VersionConflict, build_plant
+from rate_limit import InFlight, TokenBuckets, parse_budget
+from reminders import ReminderIndex
+from response_cache import CachedResponse, ResponseCache
+from schedule import DueIndex, ScheduleIndex, interval_on
+from search_index import SearchIndex
+from storage import JsonStorage
+from watering_history import HISTORY_DAYS, SLOTS, HistoryWindow, required_slots, set_days
 
 app = Flask(__name__)
+if os.environ.get('ECOBLOOM_FAST_JSON', '1') != '0':
+    json_provider.install(app)
 
 PLANTS_FILE = 'plants.json'
 
-def initialize_plants_data():
-    """Initialize plants.json with default data if it doesn't exist"""
-    if not os.path.exists(PLANTS_FILE):
+# Storage backend: 'json' (plants.json), 'sqlite' (PLANTS_DB) or 'log'
+# (PLANTS_SNAPSHOT plus the append-only PLANTS_LOG)
+STORAGE_BACKEND = os.environ.get('ECOBLOOM_STORAGE', 'json')
+PLANTS_DB = os.environ.get('ECOBLOOM_DB', 'plants.db')
+PLANTS_SNAPSHOT = os.environ.get('ECOBLOOM_SNAPSHOT', 'plants.snapshot.json')
+PLANTS_LOG = os.environ.get('ECOBLOOM_LOG', 'plants.log')
+COMPACT_INTERVAL = int(os.environ.get('ECOBLOOM_COMPACT_INTERVAL', '30'))
+
+# One small JSON file per user's garden, whatever the catalog backend
+GARDENS_DIR = os.environ.get('ECOBLOOM_GARDENS', 'gardens')
+GARDEN_COOKIE = 'garden_id'
+
+# Plant images are served from a local cache of thumbnails capped at
+# IMAGE_CACHE_MB. IMAGE_ORIGIN points every image URL at a stand-in server
+# for testing (see image_origin.py)
+IMAGE_CACHE_DIR = os.environ.get('ECOBLOOM_IMAGE_CACHE', 'image_cache')
+IMAGE_CACHE_MB = int(os.environ.get('ECOBLOOM_IMAGE_CACHE_MB', '200'))
+IMAGE_WORKERS = int(os.environ.get('ECOBLOOM_IMAGE_WORKERS', '2'))
+IMAGE_ORIGIN = os.environ.get('ECOBLOOM_IMAGE_ORIGIN')
+
+# /img URLs carry the plant version, so browsers may keep them for good
+IMAGE_MAX_AGE = 365 * 24 * 3600
+PLACEHOLDER_MAX_AGE = 300
+
+# Watering history queries cover this many days unless ?from= says otherwise
+HISTORY_WINDOW_DAYS = 30
+
+# Concurrent writes wait this long to be saved together in one write
+# (see group_commit.py). Unset, it is 2 ms under gevent workers, where it
+# is what lets a burst share writes, and 0 otherwise, since sync workers
+# handle one request at a time and would only be slowed down
+GROUP_COMMIT_MS = os.environ.get('ECOBLOOM_GROUP_COMMIT_MS')
+COMMIT_WINDOW = None if GROUP_COMMIT_MS is None else float(GROUP_COMMIT_MS) / 1000
+
+# Each client address gets a token bucket per kind of request, given as
+# "requests per second,burst": reads are GET and HEAD, catalog writes
+# rewrite the whole catalog and make every worker reload it, and writes
+# are the rest (gardens). Buckets are shared by every worker through
+# RATE_LIMIT_FILE; set ECOBLOOM_RATE_LIMIT=0 to turn them off (benchmarks do)
+RATE_LIMITING = os.environ.get('ECOBLOOM_RATE_LIMIT', '1') != '0'
+RATE_LIMITS = {
+    'read': parse_budget(os.environ.get('ECOBLOOM_RATE_LIMIT_READ', '100,400')),
+    'write': parse_budget(os.environ.get('ECOBLOOM_RATE_LIMIT_WRITE', '10,50')),
+    'catalog': parse_budget(os.environ.get('ECOBLOOM_RATE_LIMIT_CATALOG', '1,10')),
+}
+CATALOG_WRITE_ENDPOINTS = ('add_plant', 'edit_plant', 'import_plants')
+RATE_LIMIT_FILE = os.environ.get('ECOBLOOM_RATE_LIMIT_FILE', 'ratelimit.bin')
+
+# Reverse proxies (nginx and the like) in front of the app. Behind one,
+# every request comes from the proxy's address, so set this to how many
+# there are and client addresses are taken from X-Forwarded-For instead.
+# Leave it at 0 when clients connect directly: they could otherwise pick
+# their own address, and so their own rate limit bucket
+PROXY_HOPS = int(os.environ.get('ECOBLOOM_PROXY_HOPS', '0'))
+
+# Requests one worker works on at once before it answers 503; the event
+# stream is left out since browsers hold it open
+MAX_IN_FLIGHT = int(os.environ.get('ECOBLOOM_MAX_IN_FLIGHT', '200'))
+OVERLOAD_RETRY_AFTER = 1
+
+# Each worker writes its request and storage metrics here, so /metrics
+# on any of them can add up all of them
+METRICS_DIR = os.environ.get('ECOBLOOM_METRICS_DIR', 'metrics')
+
+# Admin-only endpoints and request flags need X-Admin-Token set to this;
+# without it they are off
+ADMIN_TOKEN = os.environ.get('ECOBLOOM_ADMIN_TOKEN')
+
+# Requests are profiled (see profiler.py) when an admin asks with
+# X-Profile: 1 and at random at PROFILE_SAMPLE_RATE (0 to 1)
+PROFILE_SAMPLE_RATE = float(os.environ.get('ECOBLOOM_PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL_MS = float(os.environ.get('ECOBLOOM_PROFILE_INTERVAL_MS', '2'))
+PROFILE_DIR = os.environ.get('ECOBLOOM_PROFILE_DIR', 'profiles')
+
+# /batch operations on existing plants, and the most a single request may carry
+BATCH_GARDEN_OPS = ('save', 'remove', 'water')
+BATCH_PLANT_OPS = BATCH_GARDEN_OPS + ('edit',)
+MAX_BATCH_SIZE = 500
+
+def create_storage():
+    """Create the configured storage backend"""
+    if STORAGE_BACKEND == 'sqlite':
+        from sqlite_storage import SqliteStorage
+        return SqliteStorage(PLANTS_DB)
+    if STORAGE_BACKEND == 'log':
+        from event_log import EventLogStorage
+        return EventLogStorage(PLANTS_SNAPSHOT, PLANTS_LOG)
+    return JsonStorage(PLANTS_FILE)
+
+def initialize_plants_data(storage):
+    """Seed the storage backend with default data if it is empty"""
+    if not storage.exists():
+        # A fresh database picks up an existing plants.json once
+        if not isinstance(storage, JsonStorage) and os.path.exists(PLANTS_FILE):
+            storage.save_all(JsonStorage(PLANTS_FILE).load())
+            return
+
         default_plants = [
             {
                 "id": 1,
@@ -22,10 +141,7 @@ def initialize_plants_data():
                 "soil": "Well-draining cactus/succulent mix",
                 "fertilizer": "Diluted liquid fertilizer once in spring",
                 "growth_type": "Pot",
-                "care_tips": "Allow soil to dry completely between waterings. Great for beginners and has medicinal properties.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Allow soil to dry completely between waterings. Great for beginners and has medicinal properties."
             },
             {
                 "id": 2,
@@ -38,10 +154,7 @@ def initialize_plants_data():
                 "soil": "Rich, loamy soil with good drainage",
                 "fertilizer": "Organic compost monthly",
                 "growth_type": "Pot or Open Space",
-                "care_tips": "Pinch flowers to promote leaf growth. Sacred plant with medicinal benefits. Prefers warm climate.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Pinch flowers to promote leaf growth. Sacred plant with medicinal benefits. Prefers warm climate."
             },
             {
                 "id": 3,
@@ -54,10 +167,7 @@ def initialize_plants_data():
                 "soil": "Well-drained, slightly acidic soil rich in organic matter",
                 "fertilizer": "Balanced NPK fertilizer every 2-3 weeks during growing season",
                 "growth_type": "Open Space or Large Pot",
-                "care_tips": "Prune regularly to encourage blooming. Remove dead flowers. Watch for aphids and black spot.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Prune regularly to encourage blooming. Remove dead flowers. Watch for aphids and black spot."
             },
             {
                 "id": 4,
@@ -70,10 +180,7 @@ def initialize_plants_data():
                 "soil": "Well-draining potting mix",
                 "fertilizer": "Liquid fertilizer once a month",
                 "growth_type": "Pot",
-                "care_tips": "Excellent air purifier. Can grow in water or soil. Very low maintenance and tolerates neglect.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Excellent air purifier. Can grow in water or soil. Very low maintenance and tolerates neglect."
             },
             {
                 "id": 5,
@@ -86,10 +193,7 @@ def initialize_plants_data():
                 "soil": "Sandy, well-draining cactus mix",
                 "fertilizer": "Cactus fertilizer during growing season",
                 "growth_type": "Pot",
-                "care_tips": "Overwatering is the main cause of death. Needs minimal care. Perfect for dry climates.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Overwatering is the main cause of death. Needs minimal care. Perfect for dry climates."
             },
             {
                 "id": 6,
@@ -102,10 +206,7 @@ def initialize_plants_data():
                 "soil": "Well-draining cactus or succulent mix",
                 "fertilizer": "Diluted all-purpose fertilizer in growing season",
                 "growth_type": "Pot",
-                "care_tips": "Converts CO2 to oxygen at night. Extremely hardy and drought-tolerant. Avoid overwatering.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Converts CO2 to oxygen at night. Extremely hardy and drought-tolerant. Avoid overwatering."
             },
             {
                 "id": 7,
@@ -118,10 +219,7 @@ def initialize_plants_data():
                 "soil": "Rich, well-draining soil",
                 "fertilizer": "Balanced fertilizer monthly during growing season",
                 "growth_type": "Open Space or Large Pot",
-                "care_tips": "Fast-growing and sustainable. Lucky bamboo can grow in water. Needs humidity and regular watering.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Fast-growing and sustainable. Lucky bamboo can grow in water. Needs humidity and regular watering."
             },
             {
                 "id": 8,
@@ -134,10 +232,7 @@ def initialize_plants_data():
                 "soil": "Well-drained, moderately fertile soil",
                 "fertilizer": "Low-nitrogen fertilizer every few weeks",
                 "growth_type": "Pot or Open Space",
-                "care_tips": "Deadhead regularly for continuous blooming. Natural pest repellent. Great companion plant for vegetables.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Deadhead regularly for continuous blooming. Natural pest repellent. Great companion plant for vegetables."
             },
             {
                 "id": 9,
@@ -150,10 +245,7 @@ def initialize_plants_data():
                 "soil": "Rich, well-draining soil with organic matter",
                 "fertilizer": "High-potassium fertilizer weekly during blooming",
                 "growth_type": "Open Space or Large Pot",
-                "care_tips": "Needs consistent moisture. Prune after flowering. Flowers last only one day but plant blooms continuously.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Needs consistent moisture. Prune after flowering. Flowers last only one day but plant blooms continuously."
             },
             {
                 "id": 10,
@@ -166,10 +258,7 @@ def initialize_plants_data():
                 "soil": "Well-draining potting mix rich in organic matter",
                 "fertilizer": "Balanced liquid fertilizer monthly",
                 "growth_type": "Pot",
-                "care_tips": "Excellent air purifier. Drooping leaves indicate need for water. Mist leaves for humidity. Toxic to pets.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Excellent air purifier. Drooping leaves indicate need for water. Mist leaves for humidity. Toxic to pets."
             },
             {
                 "id": 11,
@@ -182,10 +271,7 @@ def initialize_plants_data():
                 "soil": "Well-draining potting mix",
                 "fertilizer": "Liquid fertilizer bi-weekly in growing season",
                 "growth_type": "Pot",
-                "care_tips": "Great air purifier. Produces baby plants on runners. Very easy to propagate and maintain.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Great air purifier. Produces baby plants on runners. Very easy to propagate and maintain."
             },
             {
                 "id": 12,
@@ -198,10 +284,7 @@ def initialize_plants_data():
                 "soil": "Well-draining succulent mix",
                 "fertilizer": "Diluted succulent fertilizer quarterly",
                 "growth_type": "Pot",
-                "care_tips": "Symbol of good luck and prosperity. Avoid overwatering. Can live for decades with proper care.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Symbol of good luck and prosperity. Avoid overwatering. Can live for decades with proper care."
             },
             {
                 "id": 13,
@@ -214,10 +297,7 @@ def initialize_plants_data():
                 "soil": "Well-draining, slightly acidic potting mix",
                 "fertilizer": "Slow-release palm fertilizer quarterly",
                 "growth_type": "Pot or Open Space",
-                "care_tips": "Natural air humidifier. Keep soil moist but not waterlogged. Mist leaves regularly. Remove brown fronds.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Natural air humidifier. Keep soil moist but not waterlogged. Mist leaves regularly. Remove brown fronds."
             },
             {
                 "id": 14,
@@ -230,10 +310,7 @@ def initialize_plants_data():
                 "soil": "Rich, moist, well-draining soil",
                 "fertilizer": "Compost or balanced fertilizer monthly",
                 "growth_type": "Pot",
-                "care_tips": "Spreads aggressively - best in containers. Pinch regularly for bushier growth. Great for teas and cooking.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Spreads aggressively - best in containers. Pinch regularly for bushier growth. Great for teas and cooking."
             },
             {
                 "id": 15,
@@ -246,10 +323,7 @@ def initialize_plants_data():
                 "soil": "Well-draining, fertile soil",
                 "fertilizer": "Organic compost monthly",
                 "growth_type": "Pot or Open Space",
-                "care_tips": "Essential in Indian cooking. Aromatic leaves. Prune regularly to encourage bushier growth.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Essential in Indian cooking. Aromatic leaves. Prune regularly to encourage bushier growth."
             },
             {
                 "id": 16,
@@ -262,10 +336,7 @@ def initialize_plants_data():
                 "soil": "Well-draining, slightly alkaline soil",
                 "fertilizer": "Light feeding once or twice per year",
                 "growth_type": "Open Space or Large Pot",
-                "care_tips": "Drought-tolerant once established. Prune after flowering. Aromatic with calming properties.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Drought-tolerant once established. Prune after flowering. Aromatic with calming properties."
             },
             {
                 "id": 17,
@@ -278,10 +349,7 @@ def initialize_plants_data():
                 "soil": "Rich, well-draining soil",
                 "fertilizer": "Balanced liquid fertilizer every 2 weeks",
                 "growth_type": "Pot",
-                "care_tips": "Pinch off flower buds to promote leaf growth. Harvest regularly. Essential culinary herb.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Pinch off flower buds to promote leaf growth. Harvest regularly. Essential culinary herb."
             },
             {
                 "id": 18,
@@ -294,10 +362,7 @@ def initialize_plants_data():
                 "soil": "Rich, well-draining soil",
                 "fertilizer": "High-phosphorus fertilizer during blooming",
                 "growth_type": "Open Space or Large Pot",
-                "care_tips": "Highly fragrant flowers. Needs support for climbing varieties. Prune after flowering season.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Highly fragrant flowers. Needs support for climbing varieties. Prune after flowering season."
             },
             {
                 "id": 19,
@@ -310,10 +375,7 @@ def initialize_plants_data():
                 "soil": "Well-draining soil, tolerates poor soil",
                 "fertilizer": "Organic compost annually",
                 "growth_type": "Open Space",
-                "care_tips": "Natural pesticide plant. Medicinal properties. Drought-tolerant once established. Can grow quite large.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Natural pesticide plant. Medicinal properties. Drought-tolerant once established. Can grow quite large."
             },
             {
                 "id": 20,
@@ -326,124 +388,736 @@ def initialize_plants_data():
                 "soil": "Well-draining potting mix",
                 "fertilizer": "Balanced liquid fertilizer monthly in growing season",
                 "growth_type": "Pot",
-                "care_tips": "Wipe leaves with damp cloth to remove dust. Can grow quite tall indoors. Tolerates some neglect.",
-                "saved": False,
-                "last_watered": None,
-                "watering_status": {"morning": False, "evening": False}
+                "care_tips": "Wipe leaves with damp cloth to remove dust. Can grow quite tall indoors. Tolerates some neglect."
             }
         ]
         
-        with open(PLANTS_FILE, 'w') as f:
-            json.dump(default_plants, f, indent=2)
+        storage.save_all(default_plants)
+
+metrics.configure(METRICS_DIR)
+
+# Initialize plants data on startup; every gunicorn worker runs this at
+# import, so hold the write lock to let only one of them seed
+storage = create_storage()
+gardens = GardenStore(GARDENS_DIR, {
+    'reminders': lambda garden: ReminderIndex(store, schedules),
+    'due': lambda garden: DueIndex(store, schedules),
+}, COMMIT_WINDOW)
+with storage.file_lock.hold():
+    initialize_plants_data(storage)
+    migrate_shared_garden(storage, gardens)
+
+# Parsed catalog shared by every request
+store = PlantStore(storage, COMMIT_WINDOW)
+
+search_index = SearchIndex()
+store.add_index(search_index)
+
+facet_index = FacetIndex()
+store.add_index(facet_index)
+
+# Watering schedules compiled from each plant's watering_frequency
+schedules = ScheduleIndex()
+store.add_index(schedules)
+
+change_feed = ChangeFeed(store, gardens)
+
+# Encoded /get_plants responses for the current catalog revision
+catalog_responses = ResponseCache()
+
+images = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MB * 1024 * 1024, IMAGE_WORKERS, IMAGE_ORIGIN)
+
+def is_admin():
+    """Whether the request carries the admin token"""
+    token = request.headers.get('X-Admin-Token')
+    return bool(ADMIN_TOKEN and token) and hmac.compare_digest(token, ADMIN_TOKEN)
 
-def load_plants():
-    """Load plants from JSON file"""
-    with open(PLANTS_FILE, 'r') as f:
-        return json.load(f)
+# Profiling hooks are only installed when something can turn them on
+profiles = None
+if ADMIN_TOKEN or PROFILE_SAMPLE_RATE:
+    profiles = profiler.ProfileStore(PROFILE_DIR)
+    profiler.install(app, profiles, is_admin, PROFILE_SAMPLE_RATE, PROFILE_INTERVAL_MS / 1000)
 
-def save_plants(plants):
-    """Save plants to JSON file"""
-    with open(PLANTS_FILE, 'w') as f:
-        json.dump(plants, f, indent=2)
+# Load now so this worker's change history starts when it boots rather
+# than at its first request
+store.refresh()
 
-# Initialize plants data on startup
-initialize_plants_data()
+if STORAGE_BACKEND == 'log':
+    from event_log import start_compactor
+    start_compactor(store, storage, interval=COMPACT_INTERVAL)
+
+# Fields of a catalog record, as /get_plants?fields= can pick them
+CATALOG_FIELDS = ('id', 'version') + EDITABLE_FIELDS
+
+# Most plants /get_plants returns in one page
+MAX_PAGE_SIZE = 1000
+
+def project_fields(plants, fields):
+    """Keep only the comma-separated ``fields`` (plus id) of each plant"""
+    if not fields:
+        return plants
+    keep = ['id'] + [f for f in fields.split(',') if f and f != 'id']
+    return [{f: plant[f] for f in keep if f in plant} for plant in plants]
+
+def if_match_versions():
+    """Plant versions the request's If-Match header accepts, or None for any"""
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    return request.if_match.as_set()
+
+def json_object():
+    """The request's JSON body, or None if it isn't a JSON object"""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+class InvalidGardenId(Exception):
+    """Raised for a garden id that can't name a garden file"""
+
+def current_user_id():
+    """Whose garden a request is for.
+
+    Browsers carry a garden cookie; other clients can send X-Garden-Id.
+    Requests with neither use the shared default garden.
+    """
+    user_id = request.headers.get('X-Garden-Id') or request.cookies.get(GARDEN_COOKIE) or DEFAULT_USER
+    if not valid_user_id(user_id):
+        raise InvalidGardenId(user_id)
+    return user_id
+
+def plant_response(plant, message):
+    """Success response carrying the plant's new version as its ETag"""
+    response = jsonify({"success": True, "message": message, "version": plant['version']})
+    response.set_etag(str(plant['version']))
+    return response
+
+def stored_catalog_bytes():
+    """Size of the catalog's files for the configured backend"""
+    paths = {'sqlite': [PLANTS_DB, f"{PLANTS_DB}-wal"], 'log': [PLANTS_SNAPSHOT, PLANTS_LOG]}.get(STORAGE_BACKEND, [PLANTS_FILE])
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+rate_limits = TokenBuckets(RATE_LIMIT_FILE) if RATE_LIMITING else None
+in_flight = InFlight(MAX_IN_FLIGHT)
+
+if PROXY_HOPS:
+    # request.remote_addr (and the scheme) as the outermost trusted proxy saw them
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS, x_proto=PROXY_HOPS)
+
+def refuse(status, message, retry_after, reason):
+    """Turn a request away, saying when it is worth trying again"""
+    metrics.inc('ecobloom_rejected_requests_total', reason=reason)
+    response = jsonify({"success": False, "message": message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+    return response
+
+def request_kind():
+    """Which of RATE_LIMITS the request counts against"""
+    if request.method in ('GET', 'HEAD'):
+        return 'read'
+    if request.endpoint in CATALOG_WRITE_ENDPOINTS:
+        return 'catalog'
+    if request.endpoint == 'batch':
+        data = request.get_json(silent=True)
+        operations = data.get('operations') if isinstance(data, dict) else None
+        if isinstance(operations, list) and any(
+                isinstance(operation, dict) and operation.get('op') in ('add', 'edit') for operation in operations):
+            return 'catalog'
+    return 'write'
+
+@app.before_request
+def admit_request():
+    """Apply the client's rate limit, then the worker's in-flight cap"""
+    if rate_limits is not None:
+        kind = request_kind()
+        allowed, retry_after = rate_limits.take(f"{kind}:{request.remote_addr}", *RATE_LIMITS[kind])
+        if not allowed:
+            return refuse(429, "Too many requests. Please slow down.", retry_after, f"rate_limit_{kind}")
+    if request.endpoint != 'events':
+        if not in_flight.enter():
+            return refuse(503, "Server is busy. Please try again shortly.", OVERLOAD_RETRY_AFTER, 'overload')
+        g.admitted = True
+
+@app.teardown_request
+def finish_request(error):
+    if g.pop('admitted', False):
+        in_flight.leave()
+
+@app.after_request
+def record_request(response):
+    """Count and time the request under its route pattern, not its URL"""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    if 'request_started' in g:
+        metrics.observe('ecobloom_http_request_duration_seconds', time.perf_counter() - g.request_started,
+                        route=route, method=request.method)
+    metrics.inc('ecobloom_http_requests_total', route=route, method=request.method, status=response.status_code)
+    if response.content_length:
+        metrics.inc('ecobloom_http_response_bytes_total', response.content_length, route=route)
+    return response
+
+@app.errorhandler(VersionConflict)
+def version_conflict(error):
+    """Reject a write whose If-Match names an outdated plant version"""
+    response = jsonify({
+        "success": False,
+        "message": "Plant was changed by someone else. Please reload and try again.",
+        "version": error.plant['version']
+    })
+    response.status_code = 412
+    response.set_etag(str(error.plant['version']))
+    return response
+
+@app.errorhandler(InvalidGardenId)
+def invalid_garden_id(error):
+    return jsonify({"success": False, "message": "Invalid garden id"}), 400
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    """The app page; gives new browsers a garden of their own.
+
+    ?garden=ID switches this browser to an existing garden, so a household
+    can share one across devices.
+    """
+    response = app.make_response(render_template('index.html'))
+    garden_id = request.args.get('garden')
+    if garden_id is not None and not valid_user_id(garden_id):
+        raise InvalidGardenId(garden_id)
+    if garden_id is None and GARDEN_COOKIE not in request.cookies:
+        garden_id = uuid.uuid4().hex
+    if garden_id is not None:
+        response.set_cookie(GARDEN_COOKIE, garden_id, max_age=10 * 365 * 24 * 3600,
+                            httponly=True, samesite='Lax')
+    return response
 
 @app.route('/get_plants', methods=['GET'])
 def get_plants():
-    """Return all plants"""
-    plants = load_plants()
-    return jsonify(plants)
+    """Return plants, optionally a page at a time and with only some fields.
+
+    ?limit=N&after=ID pages by plant id, at most MAX_PAGE_SIZE plants a
+    page; the next page's cursor comes back in X-Next-After.
+    ?fields=id,name,... keeps only those fields.
+
+    Responses are encoded and compressed once per catalog revision and
+    query, so repeat requests are served straight from catalog_responses.
+    """
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        # A page always holds at least one plant, so the cursor moves on
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = request.args.get('after', 0, type=int)
+    # One cache entry however the same fields are spelled
+    fields = request.args.get('fields')
+    if fields is not None:
+        fields = ','.join(sorted(set(fields.split(',')) & set(CATALOG_FIELDS))) or 'id'
+
+    def build():
+        with store.lock:
+            etag = store.catalog_etag()
+            plants, next_after = store.page(after, limit)
+            headers = {'X-Catalog-Revision': str(store.revision)}
+        if next_after is not None:
+            headers['X-Next-After'] = str(next_after)
+        return CachedResponse(etag, jsonify(project_fields(plants, fields)).get_data(), headers)
+
+    cached = catalog_responses.get(store.catalog_etag(), (fields, limit, after), build)
+    encoding, body = cached.negotiate(request.accept_encodings)
+    # Each encoding is a different byte sequence, so it gets its own ETag
+    etag = cached.etag if encoding == 'identity' else f"{cached.etag}-{encoding}"
+    # Answer revalidations without sending the body
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.headers.update(cached.headers)
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    # The catalog is the same for everyone, so shared caches may keep it too,
+    # but everyone revalidates on every load
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response
+
+@app.route('/garden', methods=['GET'])
+def get_garden():
+    """The user's saved plants with their watering status for today"""
+    garden = gardens.garden(current_user_id())
+    etag = garden.etag()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify({"revision": garden.revision, "day": garden.day, "plants": garden.saved()})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.update(['Cookie', 'X-Garden-Id'])
+    return response
+
+def history_window():
+    """The first and last day a history query covers, from ?from= and ?to=.
+
+    Defaults to the HISTORY_WINDOW_DAYS up to today; raises ValueError for
+    a window that isn't a valid range of at most HISTORY_DAYS.
+    """
+    try:
+        last = date.fromisoformat(request.args.get('to', date.today().isoformat()))
+        first = request.args.get('from')
+        first = date.fromisoformat(first) if first else last - timedelta(days=HISTORY_WINDOW_DAYS - 1)
+    except ValueError:
+        raise ValueError("from and to must be dates like 2024-05-31")
+    if first > last or (last - first).days >= HISTORY_DAYS:
+        raise ValueError(f"from must be on or before to, and at most {HISTORY_DAYS} days earlier")
+    return first, last
+
+@app.route('/plants/<int:plant_id>/history', methods=['GET'])
+def plant_history(plant_id):
+    """The current user's waterings of one plant between ?from= and ?to=.
+
+    Comes with counts, adherence to the plant's watering times and streaks
+    over the window, and the days each slot was watered.
+    """
+    plant = store.get(plant_id)
+    if plant is None:
+        return jsonify({"success": False, "message": "Plant not found"}), 404
+    try:
+        first, last = history_window()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    entry = gardens.garden(current_user_id()).get(plant_id)
+    window = HistoryWindow(entry, required_slots(plant), first, last)
+    response = jsonify({
+        "id": plant_id,
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "saved": entry['saved'],
+        **window.stats(date.today()),
+        "watered": {slot: set_days(window.bits[slot], window.first) for slot in SLOTS}
+    })
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/garden/stats', methods=['GET'])
+def garden_stats():
+    """Watering stats for every plant in the current user's garden between ?from= and ?to="""
+    try:
+        first, last = history_window()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    today = date.today()
+    plants = []
+    for entry in gardens.garden(current_user_id()).saved(history=True):
+        plant = store.get(entry['id'])
+        if plant is not None:
+            stats = HistoryWindow(entry, required_slots(plant), first, last).stats(today)
+            plants.append({"id": entry['id'], "name": plant['name'], **stats})
+    done = sum(p['done'] for p in plants)
+    expected = sum(p['expected'] for p in plants)
+    response = jsonify({
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "waterings": sum(p['waterings']['morning'] + p['waterings']['evening'] for p in plants),
+        "done": done,
+        "expected": expected,
+        "adherence": round(done / expected, 3) if expected else None,
+        "missed_days": sum(p['missed_days'] for p in plants),
+        "plants": plants
+    })
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/search', methods=['GET'])
+def search():
+    """Ranked search over plant names, scientific names and care tips.
+
+    ?q= is matched word by word, by prefix, and with typo tolerance;
+    ?limit= and ?offset= page through the ranking, ?fields= projects.
+    """
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    
+    store.refresh()
+    total, ranked = search_index.search(query, limit, offset)
+    plants = [store.get(plant_id) for plant_id, score in ranked]
+    results = [
+        dict(plant, score=round(score, 3))
+        for plant, (plant_id, score) in zip(project_fields(plants, request.args.get('fields')), ranked)
+    ]
+    
+    return jsonify({"query": query, "total": total, "results": results})
+
+@app.route('/plants/filter', methods=['GET'])
+def filter_plants():
+    """Filter plants by facet values, with counts for every facet value.
+
+    Facets are sunlight, growth_type, watering_times and saved (true or
+    false, for the user's own garden). Repeating a facet ORs its values (?sunlight=Full&sunlight=Partial)
+    and different facets are ANDed. Pages with ?limit=&after= like /get_plants.
+    """
+    selected = {facet: request.args.getlist(facet) for facet in FACETS}
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    after = request.args.get('after', 0, type=int)
+    
+    saved_bits = 0
+    for entry in gardens.garden(current_user_id()).saved():
+        saved_bits |= 1 << entry['id']
+    
+    store.refresh()
+    matches, counts = facet_index.filter(selected, saved_bits)
+    page_ids = list(islice(iter_ids(matches, after), limit + 1))
+    plants = [store.get(plant_id) for plant_id in page_ids[:limit]]
+    
+    response = jsonify({
+        "total": popcount(matches),
+        "plants": project_fields(plants, request.args.get('fields')),
+        "facets": counts
+    })
+    if len(page_ids) > limit:
+        response.headers['X-Next-After'] = str(page_ids[limit - 1])
+    return response
+
+@app.route('/events', methods=['GET'])
+def events():
+    """Server-Sent Events stream of catalog changes and the user's garden.
+
+    Resumes after Last-Event-ID or ?since=REVISION, and otherwise starts
+    from the current revision.
+    """
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    if since is None:
+        store.refresh()
+        since = store.revision
+    
+    stream = change_feed.stream(since, current_user_id())
+    response = app.response_class(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/reminders/due', methods=['GET'])
+def due_reminders():
+    """Saved plants due for watering right now, grouped by time of day.
+
+    next_due says when the next reminder starts, so clients know when to ask again.
+    """
+    garden = gardens.garden(current_user_id())
+    due, next_due_at = garden.indexes['reminders'].due()
+    groups = {"morning": [], "evening": []}
+    for entry, slot in due:
+        plant = store.get(entry['id'])
+        groups[slot].append({"id": entry['id'], "name": plant['name'], "version": entry['version']})
+    
+    return jsonify({
+        "total": len(due),
+        "due": groups,
+        "next_due": next_due_at.isoformat() if next_due_at else None
+    })
+
+@app.route('/garden/due', methods=['GET'])
+def garden_due():
+    """Saved plants whose watering schedule has them due by ?date= (default today).
+
+    Overdue plants are included, most overdue first.
+    """
+    try:
+        day = date.fromisoformat(request.args.get('date', date.today().isoformat()))
+    except ValueError:
+        return jsonify({"success": False, "message": "date must look like 2024-05-31"}), 400
+    
+    garden = gardens.garden(current_user_id())
+    plants = []
+    for entry, due_day in garden.indexes['due'].due_on(day):
+        schedule = schedules.get(entry['id'])
+        plants.append({
+            "id": entry['id'],
+            "name": store.get(entry['id'])['name'],
+            "due": due_day.isoformat(),
+            "overdue_days": (day - due_day).days,
+            "every_days": interval_on(schedule, day),
+            "version": entry['version']
+        })
+    response = jsonify({"date": day.isoformat(), "total": len(plants), "plants": plants})
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/plants/changes', methods=['GET'])
+def plant_changes():
+    """Plants changed since ?since=REVISION, for clients syncing a cached catalog.
+
+    Returns the current revision, the changed plants as upserts
+    (trimmed by ?fields=) and the ids of deleted plants. Answers 410 with
+    "resync" when the change history no longer goes back that far.
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({"success": False, "message": "since is required"}), 400
+    
+    revision, plants = store.changed_since(since)
+    if plants is None:
+        return jsonify({
+            "success": False,
+            "resync": True,
+            "revision": revision,
+            "message": "Change history no longer goes back that far. Please reload the catalog."
+        }), 410
+    
+    response = jsonify({
+        "revision": revision,
+        "upserts": project_fields(plants, request.args.get('fields')),
+        "deletes": []
+    })
+    response.headers['X-Catalog-Revision'] = str(revision)
+    return response
+
+@app.route('/plants/<int:plant_id>', methods=['GET'])
+def get_plant(plant_id):
+    """Return one plant with its version as the ETag"""
+    plant = store.get(plant_id)
+    if plant is None:
+        return jsonify({"success": False, "message": "Plant not found"}), 404
+    
+    response = jsonify(plant)
+    response.set_etag(str(plant['version']))
+    return response.make_conditional(request)
+
+@app.route('/img/<int:plant_id>', methods=['GET'])
+def plant_image(plant_id):
+    """The plant's image scaled to ?size= pixels wide, from the local cache.
+
+    Plants without a usable image get a generated placeholder, which is
+    only cached briefly so a fixed image shows up soon. Clients add
+    ?v=VERSION so a changed image gets a new URL.
+    """
+    size = request.args.get('size', DEFAULT_IMAGE_SIZE, type=int)
+    if size not in IMAGE_SIZES:
+        sizes = ', '.join(str(s) for s in IMAGE_SIZES)
+        return jsonify({"success": False, "message": f"size must be one of {sizes}"}), 400
+    plant = store.get(plant_id)
+    if plant is None:
+        return jsonify({"success": False, "message": "Plant not found"}), 404
+
+    path = images.thumbnail(plant.get('image'), size)
+    if path is None:
+        response = app.response_class(placeholder_svg(plant['name'], size), mimetype='image/svg+xml')
+        response.cache_control.public = True
+        response.cache_control.max_age = PLACEHOLDER_MAX_AGE
+        return response
+    versioned = 'v' in request.args
+    response = send_file(path, mimetype=image_type(path), max_age=IMAGE_MAX_AGE if versioned else 3600)
+    response.cache_control.immutable = versioned
+    return response
 
 @app.route('/add_plant', methods=['POST'])
 def add_plant():
     """Add a new plant"""
-    data = request.json
-    plants = load_plants()
+    data = json_object()
+    error = validate_record(data)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
     
-    # Generate new ID
-    new_id = max([p['id'] for p in plants]) + 1 if plants else 1
+    new_plant = build_plant(data)
     
-    new_plant = {
-        "id": new_id,
-        "name": data.get('name'),
-        "scientific_name": data.get('scientific_name', ''),
-        "image": data.get('image', ''),
-        "watering_frequency": data.get('watering_frequency', ''),
-        "watering_times": data.get('watering_times', []),
-        "sunlight": data.get('sunlight', ''),
-        "soil": data.get('soil', ''),
-        "fertilizer": data.get('fertilizer', ''),
-        "growth_type": data.get('growth_type', ''),
-        "care_tips": data.get('care_tips', ''),
-        "saved": data.get('saved', False),
-        "last_watered": None,
-        "watering_status": {"morning": False, "evening": False}
-    }
+    # The store assigns the next id
+    store.add_plant(new_plant)
     
-    plants.append(new_plant)
-    save_plants(plants)
+    response = jsonify({"success": True, "plant": new_plant})
+    response.set_etag(str(new_plant['version']))
+    return response
+
+@app.route('/edit_plant/<int:plant_id>', methods=['POST'])
+def edit_plant(plant_id):
+    """Edit a plant's catalog details"""
+    data = json_object()
+    error = "expected a JSON object" if data is None else validate_fields(data)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
+    
+    plant = store.edit_plant(plant_id, data, if_match=if_match_versions())
+    if plant is None:
+        return jsonify({"success": False, "message": "Plant not found"}), 404
+    
+    response = jsonify({"success": True, "message": "Plant updated", "plant": plant})
+    response.set_etag(str(plant['version']))
+    return response
+
+def garden_change(plant_id, operation, message):
+    """Apply one garden operation for the current user, with If-Match on its entry"""
+    if store.get(plant_id) is None:
+        return jsonify({"success": False, "message": "Plant not found"}), 404
     
-    return jsonify({"success": True, "plant": new_plant})
+    operation.update(id=plant_id, if_match=if_match_versions())
+    entry = gardens.apply_batch(current_user_id(), [operation])[0]
+    if isinstance(entry, VersionConflict):
+        raise entry
+    return plant_response(entry, message)
 
 @app.route('/save_to_garden/<int:plant_id>', methods=['POST'])
 def save_to_garden(plant_id):
     """Save a plant to user's garden"""
-    plants = load_plants()
-    
-    for plant in plants:
-        if plant['id'] == plant_id:
-            plant['saved'] = True
-            save_plants(plants)
-            return jsonify({"success": True, "message": "Plant saved to garden"})
-    
-    return jsonify({"success": False, "message": "Plant not found"}), 404
+    operation = {"op": "save", "at": datetime.now().isoformat()}
+    return garden_change(plant_id, operation, "Plant saved to garden")
 
 @app.route('/remove_from_garden/<int:plant_id>', methods=['POST'])
 def remove_from_garden(plant_id):
     """Remove a plant from user's garden"""
-    plants = load_plants()
-    
-    for plant in plants:
-        if plant['id'] == plant_id:
-            plant['saved'] = False
-            plant['watering_status'] = {"morning": False, "evening": False}
-            save_plants(plants)
-            return jsonify({"success": True, "message": "Plant removed from garden"})
-    
-    return jsonify({"success": False, "message": "Plant not found"}), 404
+    return garden_change(plant_id, {"op": "remove"}, "Plant removed from garden")
 
 @app.route('/update_watering/<int:plant_id>', methods=['POST'])
 def update_watering(plant_id):
     """Update watering status for a plant"""
-    data = request.json
+    data = json_object() or {}
     time_of_day = data.get('time_of_day')  # 'morning' or 'evening'
+    if time_of_day not in ('morning', 'evening'):
+        return jsonify({"success": False, "message": "time_of_day must be morning or evening"}), 400
     
-    plants = load_plants()
+    operation = {"op": "water", "time": time_of_day, "at": datetime.now().isoformat()}
+    return garden_change(plant_id, operation, f"{time_of_day.capitalize()} watering recorded")
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """Apply several operations with one write to the catalog and one to the garden.
+
+    Body: {"operations": [{"op": "water", "id": 3, "time_of_day": "morning"}, ...]}
+    where op is add (with "plant"), save, remove, water (with
+    "time_of_day") or edit (with "fields"); any but add may carry
+    "if_match" with the version it expects (the garden entry's for save,
+    remove and water). Operations that fail are skipped and the rest are
+    saved together; results come back in order.
+    """
+    data = json_object()
+    operations = data.get('operations') if data is not None else None
+    if not isinstance(operations, list):
+        return jsonify({"success": False, "message": "Expected a list of operations"}), 400
+    if len(operations) > MAX_BATCH_SIZE:
+        return jsonify({"success": False, "message": f"At most {MAX_BATCH_SIZE} operations per batch"}), 400
     
-    for plant in plants:
-        if plant['id'] == plant_id:
-            plant['watering_status'][time_of_day] = True
-            plant['last_watered'] = datetime.now().isoformat()
-            save_plants(plants)
-            return jsonify({"success": True, "message": f"{time_of_day.capitalize()} watering recorded"})
+    user_id = current_user_id()
+    changed_at = datetime.now().isoformat()
+    results = [None] * len(operations)
+    catalog_ops, catalog_positions = [], []
+    garden_ops, garden_positions = [], []
+    for position, operation in enumerate(operations):
+        op = operation.get('op') if isinstance(operation, dict) else None
+        if op == 'add':
+            plant = operation.get('plant')
+            error = validate_record(plant)
+            if error:
+                results[position] = {"success": False, "message": f"plant: {error}"}
+                continue
+            catalog_ops.append({"op": "add", "plant": build_plant(plant)})
+            catalog_positions.append(position)
+        elif op in BATCH_PLANT_OPS and type(operation.get('id')) is int:
+            if_match = operation.get('if_match')
+            staged_op = {"op": op, "id": operation['id'],
+                         "if_match": None if if_match is None else {str(if_match)}}
+            if op == 'water':
+                if operation.get('time_of_day') not in ('morning', 'evening'):
+                    results[position] = {"success": False, "message": "time_of_day must be morning or evening"}
+                    continue
+                staged_op['time'] = operation['time_of_day']
+            elif op == 'edit':
+                staged_op['fields'] = operation.get('fields') or {}
+                error = ("fields must be an object" if not isinstance(staged_op['fields'], dict)
+                         else validate_fields(staged_op['fields']))
+                if error:
+                    results[position] = {"success": False, "message": error}
+                    continue
+            
+            if op in BATCH_GARDEN_OPS:
+                if store.get(operation['id']) is None:
+                    results[position] = {"success": False, "message": "Plant not found"}
+                    continue
+                staged_op['at'] = changed_at
+                garden_ops.append(staged_op)
+                garden_positions.append(position)
+            else:
+                catalog_ops.append(staged_op)
+                catalog_positions.append(position)
+        else:
+            results[position] = {"success": False, "message": "Invalid operation"}
     
-    return jsonify({"success": False, "message": "Plant not found"}), 404
+    applied = []
+    if catalog_ops:
+        applied += zip(catalog_positions, store.apply_batch(catalog_ops))
+    if garden_ops:
+        applied += zip(garden_positions, gardens.apply_batch(user_id, garden_ops))
+    for position, result in applied:
+        if result is None:
+            results[position] = {"success": False, "message": "Plant not found"}
+        elif isinstance(result, VersionConflict):
+            results[position] = {"success": False, "message": "Plant was changed by someone else",
+                                 "version": result.plant['version']}
+        else:
+            results[position] = {"success": True, "id": result['id'], "version": result['version']}
+            if operations[position]['op'] == 'add':
+                results[position]['plant'] = result
+    
+    return jsonify({"success": all(r['success'] for r in results), "results": results})
+
+@app.route('/export', methods=['GET'])
+def export_plants():
+    """Stream the whole catalog as NDJSON, one plant per line"""
+    return app.response_class(
+        export_lines(store),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=plants.ndjson'}
+    )
+
+@app.route('/import', methods=['POST'])
+def import_plants():
+    """Add plants from an NDJSON request body, streaming progress back.
+
+    Each line is validated on its own; valid plants get new ids and are
+    saved once per ?chunk_size= plants.
+    """
+    chunk_size = max(request.args.get('chunk_size', IMPORT_CHUNK_SIZE, type=int), 1)
+    lines = iter(request.stream.readline, b'')
+    return app.response_class(
+        stream_with_context(import_lines(store, lines, chunk_size)),
+        mimetype='application/x-ndjson'
+    )
 
 @app.route('/reset_watering_status', methods=['POST'])
 def reset_watering_status():
-    """Reset all watering statuses (can be called daily)"""
-    plants = load_plants()
-    
-    for plant in plants:
-        plant['watering_status'] = {"morning": False, "evening": False}
-    
-    save_plants(plants)
+    """Kept for existing daily callers; statuses now reset themselves each day"""
     return jsonify({"success": True, "message": "Watering statuses reset"})
 
+@app.route('/metrics', methods=['GET'])
+def export_metrics():
+    """Request, storage and catalog metrics from every worker, for Prometheus"""
+    metrics.set_gauge('ecobloom_catalog_plants', len(store.all()))
+    metrics.set_gauge('ecobloom_catalog_revision', store.revision)
+    metrics.set_gauge('ecobloom_catalog_stored_bytes', stored_catalog_bytes())
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profiles', methods=['GET'])
+def list_profiles():
+    """Recent request profiles, newest first; ?limit= caps how many"""
+    if profiles is None:
+        return jsonify({"success": False, "message": "Profiling is off"}), 404
+    if not is_admin():
+        return jsonify({"success": False, "message": "Admin token required"}), 403
+    limit = min(request.args.get('limit', 50, type=int), profiler.MAX_PROFILES)
+    return jsonify({"profiles": profiles.recent(limit)})
+
+@app.route('/debug/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """One profile's collapsed stacks, ready for flamegraph.pl or speedscope"""
+    if profiles is None:
+        return jsonify({"success": False, "message": "Profiling is off"}), 404
+    if not is_admin():
+        return jsonify({"success": False, "message": "Admin token required"}), 403
+    path = profiles.folded_path(profile_id)
+    if path is None:
+        return jsonify({"success": False, "message": "Profile not found"}), 404
+    return send_file(path, mimetype='text/plain', download_name=f"{profile_id}.folded")
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,373 @@
+"""Benchmark: time every route against synthetic catalogs of growing size.
+
+Each catalog size gets a scratch directory with a generated plants.json
+and a default garden, and every route is driven through the Flask test
+client (in a fresh process per size) and/or a local multi-worker
+gunicorn. Nothing leaves the machine: generated plants have no image
+URLs, so /img serves placeholders.
+
+    python bench.py --sizes 20,1000,10000,100000 --output bench-results.json
+    python bench.py --modes gunicorn --workers 4 --concurrency 8
+    python bench.py --compare old.json new.json
+
+Results list throughput, p50/p99 latency, response bytes and bytes
+written per request (write() calls by the serving processes, from
+/proc/<pid>/io; null where that isn't available) for each mode, size
+and route.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from garden_store import new_entry
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Plants saved in each synthetic catalog's default garden
+GARDEN_SIZE = 50
+
+FREQUENCIES = (
+    'Daily', 'Alternate days', 'Twice weekly', 'Once weekly', '2-3 times weekly',
+    'Once every 2-3 weeks', 'Daily in summer, alternate days in winter', 'Keep soil consistently moist',
+)
+SUNLIGHT = ('Full', 'Partial', 'Shade', 'Partial to Full')
+GROWTH = ('Pot', 'Open Space', 'Pot or Open Space')
+WORDS = ('green', 'leaf', 'fern', 'palm', 'lily', 'rose', 'basil', 'mint', 'ivy', 'moss', 'cactus', 'orchid')
+
+
+def synthetic_plant(plant_id, rng):
+    name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {plant_id}"
+    return {
+        "id": plant_id,
+        "name": name,
+        "scientific_name": f"{rng.choice(WORDS).title()}us {rng.choice(WORDS)}ii",
+        "image": "",
+        "watering_frequency": rng.choice(FREQUENCIES),
+        "watering_times": rng.choice([["Morning"], ["Evening"], ["Morning", "Evening"]]),
+        "sunlight": rng.choice(SUNLIGHT),
+        "soil": "Well-draining potting mix",
+        "fertilizer": "Liquid fertilizer once a month",
+        "growth_type": rng.choice(GROWTH),
+        "care_tips": ' '.join(rng.choice(WORDS) for _ in range(20)),
+        "version": 1
+    }
+
+
+def make_catalog(size, directory, seed=0):
+    """Write a plants.json of ``size`` plants and a default garden into ``directory``"""
+    rng = random.Random(seed)
+    plants = [synthetic_plant(plant_id, rng) for plant_id in range(1, size + 1)]
+    with open(os.path.join(directory, 'plants.json'), 'w') as f:
+        json.dump({"revision": 0, "plants": plants}, f)
+
+    entries = []
+    for plant_id in range(1, min(size, GARDEN_SIZE) + 1):
+        entry = new_entry(plant_id)
+        entry.update(saved=True, version=1, history={"start": date.today().isoformat(), "morning": "0", "evening": "0"})
+        entries.append(entry)
+    os.makedirs(os.path.join(directory, 'gardens'), exist_ok=True)
+    with open(os.path.join(directory, 'gardens', 'default.json'), 'w') as f:
+        json.dump({"revision": 0, "plants": entries}, f)
+
+
+class Route:
+    """One benchmarked request; ``path`` and ``body`` get the catalog size and request number"""
+
+    def __init__(self, name, method, path, body=None, writes=False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.writes = writes
+
+    def request(self, size, i):
+        body = self.body(size, i) if self.body else None
+        return self.method, self.path(size, i), body
+
+
+def garden_id(size, i):
+    return i % min(size, GARDEN_SIZE) + 1
+
+
+def plant_id(size, i):
+    return i * 7919 % size + 1
+
+
+ROUTES = [
+    Route('get_plants', 'GET', lambda size, i: '/get_plants'),
+    Route('get_plants_page', 'GET',
+          lambda size, i: f'/get_plants?limit=100&after={plant_id(size, i) - 1}&fields=id,name,sunlight,version'),
+    Route('get_plant', 'GET', lambda size, i: f'/plants/{plant_id(size, i)}'),
+    Route('search', 'GET', lambda size, i: f'/search?q={WORDS[i % len(WORDS)]}'),
+    Route('filter', 'GET', lambda size, i: '/plants/filter?' + urllib.parse.urlencode({'sunlight': SUNLIGHT[i % len(SUNLIGHT)], 'saved': 'true'})),
+    Route('garden', 'GET', lambda size, i: '/garden'),
+    Route('garden_stats', 'GET', lambda size, i: '/garden/stats'),
+    Route('garden_due', 'GET', lambda size, i: '/garden/due'),
+    Route('reminders_due', 'GET', lambda size, i: '/reminders/due'),
+    Route('plant_history', 'GET', lambda size, i: f'/plants/{garden_id(size, i)}/history'),
+    Route('plant_changes', 'GET', lambda size, i: '/plants/changes?since=0'),
+    Route('img_placeholder', 'GET', lambda size, i: f'/img/{plant_id(size, i)}?size=400'),
+    Route('export', 'GET', lambda size, i: '/export'),
+    Route('add_plant', 'POST', lambda size, i: '/add_plant',
+          lambda size, i: {"name": f"Bench plant {i}", "watering_frequency": "Daily", "watering_times": ["Morning"]},
+          writes=True),
+    Route('edit_plant', 'POST', lambda size, i: f'/edit_plant/{plant_id(size, i)}',
+          lambda size, i: {"care_tips": f"Edited {i}"}, writes=True),
+    Route('save_to_garden', 'POST', lambda size, i: f'/save_to_garden/{plant_id(size, i)}', writes=True),
+    Route('update_watering', 'POST', lambda size, i: f'/update_watering/{garden_id(size, i)}',
+          lambda size, i: {"time_of_day": ('morning', 'evening')[i % 2]}, writes=True),
+    Route('batch_water', 'POST', lambda size, i: '/batch',
+          lambda size, i: {"operations": [{"op": "water", "id": garden_id(size, i + n), "time_of_day": "morning"}
+                                          for n in range(10)]},
+          writes=True),
+    Route('reset_watering_status', 'POST', lambda size, i: '/reset_watering_status', writes=True),
+]
+
+
+def written_bytes(pids):
+    """Total bytes the processes have passed to write(), or None without /proc"""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/io') as f:
+                fields = dict(line.split(': ') for line in f.read().splitlines())
+        except (OSError, ValueError):
+            return None
+        total += int(fields['wchar'])
+    return total
+
+
+def summarize(mode, size, route, latencies, elapsed, response_bytes, written):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "mode": mode,
+        "size": size,
+        "route": route.name,
+        "requests": count,
+        "throughput": round(count / elapsed, 1),
+        "p50_ms": round(latencies[count // 2] * 1000, 3),
+        "p99_ms": round(latencies[min(count - 1, int(count * 0.99))] * 1000, 3),
+        "response_bytes": response_bytes // count,
+        "bytes_written_per_request": None if written is None else written // count,
+    }
+
+
+def request_count(route, args):
+    return args.write_requests if route.writes else args.requests
+
+
+def run_client(directory, size, args, queue):
+    """Drive every route through the Flask test client; runs in its own process"""
+    os.chdir(directory)
+    os.environ['ECOBLOOM_RATE_LIMIT'] = '0'
+    sys.path.insert(0, APP_DIR)
+    from EcoBloom import app
+
+    client = app.test_client()
+    results = []
+    for route in ROUTES:
+        count = request_count(route, args)
+        latencies, response_bytes = [], 0
+        written_before = written_bytes([os.getpid()])
+        started = time.perf_counter()
+        for i in range(count):
+            method, path, body = route.request(size, i)
+            sent = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            response_bytes += len(response.get_data())
+            latencies.append(time.perf_counter() - sent)
+        elapsed = time.perf_counter() - started
+        written_after = written_bytes([os.getpid()])
+        written = None if written_before is None else written_after - written_before
+        results.append(summarize('client', size, route, latencies, elapsed, response_bytes, written))
+    queue.put(results)
+
+
+def worker_pids(server):
+    """The gunicorn workers under ``server``, from /proc"""
+    try:
+        with open(f'/proc/{server.pid}/task/{server.pid}/children') as f:
+            return [int(pid) for pid in f.read().split()]
+    except OSError:
+        return []
+
+
+def start_gunicorn(directory, workers, worker_class):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=APP_DIR, ECOBLOOM_RATE_LIMIT='0')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-k', worker_class,
+         '-b', f"127.0.0.1:{port}", '--timeout', '120', 'EcoBloom:app'],
+        cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(600):
+        try:
+            urllib.request.urlopen(f"{url}/garden").close()
+            # Every worker loads the catalog at import; wait until all are up
+            if len(worker_pids(server)) >= workers or not os.path.exists('/proc'):
+                return server, url
+        except OSError:
+            pass
+        time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def send(url, method, path, body):
+    """One HTTP request; returns (seconds, response bytes)"""
+    data = None if body is None else json.dumps(body).encode()
+    request = urllib.request.Request(url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            size = len(response.read())
+    except urllib.error.HTTPError as e:
+        size = len(e.read())
+    return time.perf_counter() - started, size
+
+
+def run_gunicorn(directory, size, args):
+    """Drive every route over HTTP with ``args.concurrency`` clients at once"""
+    server, url = start_gunicorn(directory, args.workers, args.worker_class)
+    results = []
+    try:
+        pids = worker_pids(server)
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            for route in ROUTES:
+                count = request_count(route, args)
+                requests = [route.request(size, i) for i in range(count)]
+                written_before = written_bytes(pids)
+                started = time.perf_counter()
+                timings = list(pool.map(lambda r: send(url, *r), requests))
+                elapsed = time.perf_counter() - started
+                written_after = written_bytes(pids)
+                written = None if written_before is None or written_after is None else written_after - written_before
+                results.append(summarize('gunicorn', size, route, [t for t, _ in timings], elapsed,
+                                         sum(n for _, n in timings), written))
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+def benchmark(args):
+    results = []
+    for size in args.sizes:
+        for mode in args.modes:
+            directory = tempfile.mkdtemp(prefix=f'ecobloom-bench-{size}-')
+            try:
+                make_catalog(size, directory)
+                print(f"{mode}, {size} plants...", file=sys.stderr)
+                if mode == 'client':
+                    # A fresh process per catalog, since the app loads it at import
+                    context = multiprocessing.get_context('spawn')
+                    queue = context.Queue()
+                    process = context.Process(target=run_client, args=(directory, size, args, queue))
+                    process.start()
+                    size_results = queue.get()
+                    process.join()
+                else:
+                    size_results = run_gunicorn(directory, size, args)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            for result in size_results:
+                print_result(result)
+            results.extend(size_results)
+    return results
+
+
+def print_result(result):
+    written = result['bytes_written_per_request']
+    print(f"{result['mode']:8} {result['size']:>7} {result['route']:22} "
+          f"{result['throughput']:>9.1f}/s  p50 {result['p50_ms']:>9.2f}ms  p99 {result['p99_ms']:>9.2f}ms  "
+          f"resp {result['response_bytes']:>9}B  written {'-' if written is None else written:>9}B")
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(old_path, new_path, threshold):
+    """Print routes whose p50/p99 or throughput moved by more than ``threshold``"""
+    with open(old_path) as f:
+        old = {(r['mode'], r['size'], r['route']): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = json.load(f)['results']
+    regressions = 0
+    for result in new:
+        before = old.get((result['mode'], result['size'], result['route']))
+        if before is None:
+            continue
+        changes = []
+        for key, worse_when_higher in (('p50_ms', True), ('p99_ms', True), ('throughput', False)):
+            if before[key]:
+                ratio = result[key] / before[key]
+                if (ratio > 1 + threshold) if worse_when_higher else (ratio < 1 - threshold):
+                    changes.append(f"{key} {before[key]} -> {result[key]}")
+        if changes:
+            regressions += 1
+            print(f"{result['mode']:8} {result['size']:>7} {result['route']:22} " + ', '.join(changes))
+    print(f"{regressions} regression(s) over {threshold:.0%}")
+    return regressions == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='20,1000,10000,100000',
+                        type=lambda text: [int(n) for n in text.split(',')])
+    parser.add_argument('--modes', default='client,gunicorn', type=lambda text: text.split(','))
+    parser.add_argument('--requests', type=int, default=200, help='requests per read route')
+    parser.add_argument('--write-requests', type=int, default=50, help='requests per write route')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    parser.add_argument('--worker-class', default='sync', help='gunicorn worker class')
+    parser.add_argument('--concurrency', type=int, default=8, help='clients at once against gunicorn')
+    parser.add_argument('--output', help='write results as JSON here')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare(*args.compare, args.threshold) else 1)
+
+    results = benchmark(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                "created": datetime.now().isoformat(timespec='seconds'),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Streaming NDJSON import and export of the plant catalog.
+
+Also usable from the command line against the configured storage:
+
+    python bulk.py export -o plants.ndjson
+    python bulk.py import nursery.ndjson --chunk-size 1000
+"""
+import argparse
+import json
+import sys
+
+from plant_store import build_plant
+
+EXPORT_PAGE_SIZE = 500
+IMPORT_CHUNK_SIZE = 1000
+
+# Per-line errors reported back before only the count keeps going up
+MAX_REPORTED_ERRORS = 100
+
+TEXT_FIELDS = (
+    'name', 'scientific_name', 'image', 'watering_frequency', 'sunlight',
+    'soil', 'fertilizer', 'growth_type', 'care_tips'
+)
+WATERING_TIMES = ('Morning', 'Evening')
+
+
+def export_lines(store):
+    """Yield the catalog as NDJSON lines, one page of plants at a time"""
+    after = 0
+    while after is not None:
+        plants, after = store.page(after, EXPORT_PAGE_SIZE)
+        yield ''.join(json.dumps(plant) + '\n' for plant in plants)
+
+
+def validate_record(record):
+    """Return why a new plant record can't be used, or None if it is fine"""
+    if not isinstance(record, dict):
+        return "expected a JSON object"
+    if not isinstance(record.get('name'), str) or not record['name'].strip():
+        return "name is required"
+    return validate_fields(record)
+
+
+def validate_fields(fields):
+    """Return why plant fields can't be stored, or None; only fields present are checked"""
+    for field in TEXT_FIELDS:
+        if field in fields and not isinstance(fields[field], str):
+            return f"{field} must be a string"
+    if 'name' in fields and not fields['name'].strip():
+        return "name is required"
+    times = fields.get('watering_times', [])
+    if not isinstance(times, list) or any(t not in WATERING_TIMES for t in times):
+        return "watering_times must be a list of Morning/Evening"
+    return None
+
+
+def import_lines(store, lines, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import NDJSON ``lines`` into ``store``, yielding progress as NDJSON.
+
+    Valid records get new ids and are written one chunk per storage write;
+    ids in the input are ignored. Progress lines report running totals after
+    each chunk, followed by a final summary with ``"done": true``.
+    """
+    imported = rejected = 0
+    first_id = last_id = None
+    chunk = []
+
+    def flush():
+        nonlocal imported, first_id, last_id
+        results = store.apply_batch([{"op": "add", "plant": plant} for plant in chunk])
+        chunk.clear()
+        imported += len(results)
+        if results:
+            first_id = results[0]['id'] if first_id is None else first_id
+            last_id = results[-1]['id']
+        return json.dumps({"imported": imported, "rejected": rejected}) + '\n'
+
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            error = "invalid JSON"
+        else:
+            error = validate_record(record)
+        if error:
+            rejected += 1
+            if rejected <= MAX_REPORTED_ERRORS:
+                yield json.dumps({"line": line_number, "error": error}) + '\n'
+            continue
+
+        chunk.append(build_plant(record))
+        if len(chunk) >= chunk_size:
+            yield flush()
+
+    if chunk:
+        yield flush()
+    yield json.dumps({"done": True, "imported": imported, "rejected": rejected,
+                      "first_id": first_id, "last_id": last_id}) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import or export the plant catalog as NDJSON')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='write every plant as one JSON line')
+    export_parser.add_argument('-o', '--output', help='file to write (default: stdout)')
+    import_parser = commands.add_parser('import', help='add plants from an NDJSON file')
+    import_parser.add_argument('path', help="NDJSON file, or '-' for stdin")
+    import_parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    # Uses the storage backend configured for the app (ECOBLOOM_STORAGE etc.)
+    from EcoBloom import store
+
+    if args.command == 'export':
+        out = open(args.output, 'w') if args.output else sys.stdout
+        try:
+            for text in export_lines(store):
+                out.write(text)
+        finally:
+            if args.output:
+                out.close()
+        return
+
+    source = sys.stdin if args.path == '-' else open(args.path, 'r')
+    try:
+        for progress in import_lines(store, source, args.chunk_size):
+            sys.stderr.write(progress)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Server-Sent Events feed of catalog and garden changes.
+
+Each open stream spends its time waiting on an event, so a gevent worker
+can hold thousands of them:
+
+    gunicorn -k gevent -w 4 EcoBloom:app
+
+With the default sync worker every open stream occupies a worker.
+"""
+import json
+import threading
+import time
+
+# How often other workers' writes are picked up while streams are open
+POLL_INTERVAL = 1.0
+
+# Idle streams get a comment this often so proxies keep them open
+HEARTBEAT_INTERVAL = 15.0
+
+# How long browsers wait before reconnecting a dropped stream
+RETRY_MS = 3000
+
+
+class ChangeFeed:
+    """Turns PlantStore change records and Garden updates into SSE streams.
+
+    The feed registers itself as a PlantStore index and a GardenStore
+    listener, so changes made in this process wake the streams that care
+    about them straight away. A single background thread refreshes the
+    catalog and the gardens being watched while any stream is open, so
+    changes from other workers arrive within POLL_INTERVAL without every
+    stream checking storage on its own.
+    """
+
+    def __init__(self, store, gardens, poll_interval=POLL_INTERVAL):
+        self.store = store
+        self.gardens = gardens
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        # One wake-up event per open stream, with the user it follows
+        self._streams = {}
+        self._poller = None
+        store.add_index(self)
+        gardens.add_listener(self._garden_changed)
+
+    def rebuild(self, plants):
+        """PlantStore index hook: the catalog was reloaded"""
+        self._wake(None)
+
+    def apply(self, event, plant):
+        """PlantStore index hook: a change was committed"""
+        self._wake(None)
+
+    def _garden_changed(self, user_id):
+        self._wake(user_id)
+
+    def _wake(self, user_id):
+        """Wake the streams following ``user_id``'s garden, or all of them for None"""
+        with self._lock:
+            for wake, stream_user in self._streams.items():
+                if user_id is None or user_id == stream_user:
+                    wake.set()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                users = set(self._streams.values())
+            if not users:
+                continue
+            try:
+                self.store.refresh()
+                for user_id in users:
+                    self.gardens.refresh(user_id)
+            except Exception:
+                # Storage mid-rewrite or briefly unavailable; try again next tick
+                pass
+
+    def _open(self, wake, user_id):
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name='change-feed-poller', daemon=True)
+                self._poller.start()
+            self._streams[wake] = user_id
+
+    def stream(self, since, user_id):
+        """Yield SSE messages for catalog changes after revision ``since``
+        and for every change to ``user_id``'s garden.
+
+        Change records are sent with their revision as the event id, so a
+        reconnecting browser resumes from Last-Event-ID. A "reload" event
+        means the records no longer go back far enough and the client has
+        to fetch the catalog again. A "garden" event carries the user's
+        saved plants whenever the garden changes, including when a new day
+        clears the watering statuses.
+        """
+        wake = threading.Event()
+        self._open(wake, user_id)
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            garden_etag = None
+            while True:
+                # Cleared before looking, so a change that lands meanwhile
+                # still ends the wait below
+                wake.clear()
+                current, changes = self.store.changes_since(since)
+                if changes is None:
+                    yield f"event: reload\nid: {current}\ndata: {json.dumps({'rev': current})}\n\n"
+                else:
+                    for revision, plant_id, record in changes:
+                        yield f"id: {revision}\ndata: {record}\n\n"
+                since = current
+
+                garden = self.gardens.garden(user_id)
+                if garden.etag() != garden_etag:
+                    garden_etag = garden.etag()
+                    data = {"revision": garden.revision, "day": garden.day, "plants": garden.saved()}
+                    yield f"event: garden\ndata: {json.dumps(data)}\n\n"
+
+                if not wake.wait(HEARTBEAT_INTERVAL):
+                    yield ": keep-alive\n\n"
+        finally:
+            with self._lock:
+                del self._streams[wake]
@@ -0,0 +1,137 @@
+"""Bitmap indexes for faceted filtering of the plant catalog"""
+import threading
+from collections import defaultdict
+
+# Low-cardinality plant fields users can filter on
+CATALOG_FACETS = ('sunlight', 'growth_type', 'watering_times')
+# plus whether the plant is in the user's own garden
+FACETS = CATALOG_FACETS + ('saved',)
+
+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:  # Python < 3.10
+    def popcount(bits):
+        return bin(bits).count('1')
+
+
+def facet_values(plant, facet):
+    """The values a plant has for one facet, as strings"""
+    value = plant.get(facet)
+    if isinstance(value, list):
+        return {item for item in value if isinstance(item, str)}
+    return {value} if isinstance(value, str) and value else set()
+
+
+def iter_ids(bits, after=0):
+    """Plant ids whose bits are set, in ascending order, above ``after``"""
+    bits >>= after + 1
+    offset = after + 1
+    while bits:
+        low = bits & -bits
+        yield offset + low.bit_length() - 1
+        bits ^= low
+
+
+class FacetIndex:
+    """One int bitset per facet value, with bit N standing for plant id N.
+
+    Filters OR the bitsets of the values picked within a facet and AND the
+    facets together; counts are popcounts of those same bitsets. Like
+    SearchIndex it rebuilds lazily after a reload and is patched in place
+    as plants are added or edited. The "saved" facet differs per user, so
+    its bitset is handed in with each query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bitmaps = {facet: defaultdict(int) for facet in CATALOG_FACETS}
+        # plant_id -> {facet: values}, so changes can clear the old bits
+        self._plant_values = {}
+        self._all = 0
+        self._source = {}
+        self._stale = True
+
+    def rebuild(self, plants):
+        """Start over from ``plants`` (a dict by id) on the next query"""
+        with self._lock:
+            self._source = plants
+            self._stale = True
+
+    def apply(self, event, plant):
+        """Keep the bitmaps in step with one committed change"""
+        if event['op'] not in ('add', 'edit'):
+            return
+        with self._lock:
+            if self._stale:
+                return
+            self._remove(plant['id'])
+            self._add(plant)
+
+    def _build(self):
+        for bitmaps in self._bitmaps.values():
+            bitmaps.clear()
+        self._plant_values.clear()
+        self._all = 0
+        for plant in self._source.values():
+            self._add(plant)
+        self._stale = False
+
+    def _add(self, plant):
+        bit = 1 << plant['id']
+        values = {}
+        for facet in CATALOG_FACETS:
+            values[facet] = facet_values(plant, facet)
+            for value in values[facet]:
+                self._bitmaps[facet][value] |= bit
+        self._plant_values[plant['id']] = values
+        self._all |= bit
+
+    def _remove(self, plant_id):
+        values = self._plant_values.pop(plant_id, None)
+        if values is None:
+            return
+        mask = ~(1 << plant_id)
+        for facet, facet_vals in values.items():
+            bitmaps = self._bitmaps[facet]
+            for value in facet_vals:
+                bitmaps[value] &= mask
+                if not bitmaps[value]:
+                    del bitmaps[value]
+        self._all &= mask
+
+    def filter(self, selected, saved_bits=0):
+        """Apply ``selected`` ({facet: [values]}) to the catalog.
+
+        ``saved_bits`` has the bits of the plants in the user's garden set.
+        Returns the matching bitset and the counts for every facet value.
+        Each facet's counts ignore that facet's own selection, so picking
+        "Full" still shows how many "Partial" plants there are.
+        """
+        with self._lock:
+            if self._stale:
+                self._build()
+            saved_bits &= self._all
+            bitmaps = dict(self._bitmaps)
+            bitmaps['saved'] = {value: bits for value, bits in
+                                (('true', saved_bits), ('false', self._all & ~saved_bits)) if bits}
+            masks = {}
+            for facet, values in selected.items():
+                if values:
+                    masks[facet] = 0
+                    for value in values:
+                        masks[facet] |= bitmaps[facet].get(value, 0)
+
+            matches = self._all
+            for bits in masks.values():
+                matches &= bits
+
+            counts = {}
+            for facet in FACETS:
+                others = self._all
+                for other, bits in masks.items():
+                    if other != facet:
+                        others &= bits
+                counts[facet] = {value: popcount(bits & others)
+                                 for value, bits in bitmaps[facet].items()}
+        return matches, counts
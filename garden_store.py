@@ -0,0 +1,302 @@
+"""Per-user gardens kept apart from the shared plant catalog"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+
+import metrics
+from group_commit import GroupCommit, Unwritten
+from plant_store import GARDEN_FIELDS, STALE, VersionConflict
+from storage import JsonStorage
+from watering_history import new_history, record_watering, seed_history
+
+# Garden used by clients that don't say whose garden they mean, and the
+# one the single shared garden of older catalogs is moved into
+DEFAULT_USER = 'default'
+
+# User ids double as file names
+USER_ID_RE = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+# Gardens kept parsed in memory per process
+MAX_CACHED_GARDENS = 1024
+
+
+def valid_user_id(user_id):
+    return bool(user_id) and USER_ID_RE.fullmatch(user_id) is not None
+
+
+def new_entry(plant_id):
+    """A garden entry for a plant the user has not touched yet"""
+    return {
+        "id": plant_id,
+        "saved": False,
+        "last_watered": None,
+        "watering_day": None,
+        "watering_status": {"morning": False, "evening": False},
+        "version": 0
+    }
+
+
+def apply_garden_event(entries, event):
+    """Apply one garden change to a dict of entries keyed by plant id.
+
+    Entries stay around after a plant is removed from the garden, so
+    versions keep counting up and the watering history is kept. Watering
+    status belongs to the local day in ``watering_day``; the first
+    watering on a new day starts that day's status from scratch. Every
+    watering also goes into the entry's ``history`` (see
+    watering_history), which starts the day the plant is first saved.
+    """
+    op = event['op']
+    entry = entries.get(event['id'])
+    if entry is None:
+        entry = entries[event['id']] = new_entry(event['id'])
+    seed_history(entry)
+    if op == 'save':
+        entry['saved'] = True
+        if 'history' not in entry and 'at' in event:
+            entry['history'] = new_history(event['at'][:10])
+    elif op == 'remove':
+        entry['saved'] = False
+        entry['watering_status'] = {"morning": False, "evening": False}
+    elif op == 'water':
+        day = event['at'][:10]
+        if entry['watering_day'] != day:
+            entry['watering_day'] = day
+            entry['watering_status'] = {"morning": False, "evening": False}
+        entry['watering_status'][event['time']] = True
+        entry['last_watered'] = event['at']
+        record_watering(entry, day, event['time'])
+    else:
+        raise ValueError(f"Unknown garden event: {op}")
+    entry['version'] += 1
+    return entry
+
+
+class Garden:
+    """One user's saved plants and watering status, in a small file of its own.
+
+    Mirrors PlantStore: entries are re-read only when the file changes and
+    writes hold the file's cross-process lock on fresh data, so garden
+    writes never touch the catalog or anyone else's garden. Watering ticks
+    from an earlier day read as not done.
+    """
+
+    def __init__(self, user_id, storage, commit_window=None):
+        self.user_id = user_id
+        self.storage = storage
+        # Concurrent apply_batch calls share storage writes
+        self._commits = GroupCommit(self._apply_now, 'garden', commit_window)
+        self.lock = threading.RLock()
+        self.revision = 0
+        # Local day the in-memory watering statuses are for
+        self.day = None
+        self._entries = {}
+        # Indexes by name, kept in step with the entries
+        self.indexes = {}
+        self._signature = None
+        self._loaded = False
+
+    def refresh(self):
+        """Reload from storage if it changed; returns True if anything moved on"""
+        signature = self.storage.signature()
+        if self._loaded and signature == self._signature:
+            return self._expire_watering()
+        with self.lock, self.storage.file_lock.hold(shared=True):
+            signature = self.storage.signature()
+            self._entries = {entry['id']: entry for entry in self.storage.load()}
+            self.revision = self.storage.revision
+            self.day = None
+            self._expire_watering()
+            for index in self.indexes.values():
+                index.rebuild(self._entries)
+            # Only now, so an index that failed to rebuild is tried again
+            self._signature = signature
+            self._loaded = True
+        return True
+
+    def _expire_watering(self):
+        """Clear watering ticks left over from an earlier day, in memory only"""
+        today = date.today().isoformat()
+        if today == self.day:
+            return False
+        with self.lock:
+            for entry in self._entries.values():
+                if entry['watering_day'] != today:
+                    entry['watering_status'] = {"morning": False, "evening": False}
+            self.day = today
+        return True
+
+    def add_index(self, name, index):
+        """Keep ``index`` in step with the garden, like PlantStore.add_index"""
+        with self.lock:
+            self.indexes[name] = index
+            if self._loaded:
+                index.rebuild(self._entries)
+
+    @contextmanager
+    def writing(self):
+        """Hold the process and cross-process write locks on fresh data"""
+        with self.lock, self.storage.file_lock.hold():
+            self.refresh()
+            yield
+
+    def etag(self):
+        """Validator for the whole garden; changes with every write, reload or day"""
+        self.refresh()
+        return f"{self.revision}-{self.day}"
+
+    def saved(self, history=False):
+        """Entries for the plants in the garden, in plant id order.
+
+        Their watering history is left out unless ``history`` is true.
+        """
+        self.refresh()
+        with self.lock:
+            entries = sorted(self._entries.values(), key=lambda e: e['id'])
+            if history:
+                return [entry for entry in entries if entry['saved']]
+            return [{key: value for key, value in entry.items() if key != 'history'}
+                    for entry in entries if entry['saved']]
+
+    def get(self, plant_id):
+        """The plant's garden entry, or a blank one if the user never touched it"""
+        self.refresh()
+        return self._entries.get(plant_id) or new_entry(plant_id)
+
+    def apply_batch(self, operations):
+        """Apply save, remove and water operations with one write.
+
+        Operations are dicts with ``op``, the plant ``id``, an optional
+        ``if_match`` (acceptable entry versions as strings) and, for water,
+        ``time`` and ``at``. Returns a copy of the entry as each operation
+        left it, or the VersionConflict that rejected it. Other batches
+        submitted meanwhile are written along with it (see group_commit).
+        """
+        return self._commits.submit(operations)
+
+    def _apply_now(self, operations):
+        results, events = [], []
+        with self.writing():
+            try:
+                for operation in operations:
+                    entry = self._entries.get(operation['id']) or new_entry(operation['id'])
+                    if_match = operation.get('if_match')
+                    if if_match is not None and str(entry['version']) not in if_match:
+                        results.append(VersionConflict(entry))
+                        continue
+                    event = {key: operation[key] for key in ('op', 'id', 'time', 'at') if key in operation}
+                    entry = apply_garden_event(self._entries, event)
+                    events.append((event, entry))
+                    results.append(dict(entry))
+            except Exception as e:
+                # As in PlantStore: reload rather than keep unwritten changes
+                self._signature = STALE
+                raise Unwritten(e) from e
+            except BaseException:
+                self._signature = STALE
+                raise
+            if events:
+                try:
+                    self.storage.record([event for event, entry in events], self._entries)
+                except BaseException:
+                    self._signature = STALE
+                    raise
+                self.revision = self.storage.revision
+                self._signature = self.storage.signature()
+                for name, index in self.indexes.items():
+                    try:
+                        for event, entry in events:
+                            index.apply(event, entry)
+                    except Exception:
+                        # Written already; the reload rebuilds the index
+                        metrics.inc('ecobloom_index_errors_total', index=name)
+                        self._signature = STALE
+        return results
+
+
+class GardenStore:
+    """Hands out each user's Garden, stored as ``<directory>/<user_id>.json``.
+
+    Recently used gardens stay parsed in memory. Each gets an index from
+    every ``index_factories`` entry (name -> callable taking the garden)
+    and groups concurrent writes with a ``commit_window`` (see
+    group_commit). Listeners are called with the user id whenever a
+    garden changes, whether through this process or when a reload picks
+    up another worker's write.
+    """
+
+    def __init__(self, directory, index_factories=None, commit_window=None):
+        self.directory = directory
+        self.index_factories = index_factories or {}
+        self.commit_window = commit_window
+        self._lock = threading.Lock()
+        self._gardens = OrderedDict()
+        self._listeners = []
+        os.makedirs(directory, exist_ok=True)
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _notify(self, user_id):
+        for listener in self._listeners:
+            listener(user_id)
+
+    def path(self, user_id):
+        return os.path.join(self.directory, f"{user_id}.json")
+
+    def exists(self, user_id):
+        return os.path.exists(self.path(user_id))
+
+    def garden(self, user_id):
+        """The user's Garden, loading it on first use"""
+        with self._lock:
+            garden = self._gardens.get(user_id)
+            if garden is not None:
+                self._gardens.move_to_end(user_id)
+                return garden
+            garden = Garden(user_id, JsonStorage(self.path(user_id), kind='garden'), self.commit_window)
+            for name, factory in self.index_factories.items():
+                garden.add_index(name, factory(garden))
+            self._gardens[user_id] = garden
+            if len(self._gardens) > MAX_CACHED_GARDENS:
+                self._gardens.popitem(last=False)
+            return garden
+
+    def refresh(self, user_id):
+        """Pick up changes to a user's garden from other workers or a new day"""
+        if self.garden(user_id).refresh():
+            self._notify(user_id)
+
+    def apply_batch(self, user_id, operations):
+        """Garden.apply_batch for one user, telling listeners about the change"""
+        results = self.garden(user_id).apply_batch(operations)
+        if any(not isinstance(result, VersionConflict) for result in results):
+            self._notify(user_id)
+        return results
+
+
+def migrate_shared_garden(catalog_storage, gardens):
+    """Move the garden older catalogs kept on each plant into DEFAULT_USER's.
+
+    Only runs while the default garden doesn't exist yet; the old fields
+    are dropped from the catalog the next time each plant is written.
+    """
+    if gardens.exists(DEFAULT_USER) or not catalog_storage.exists():
+        return 0
+    entries = []
+    for plant in catalog_storage.load():
+        if not plant.get('saved') and not plant.get('last_watered'):
+            continue
+        entry = new_entry(plant['id'])
+        entry.update({field: plant[field] for field in GARDEN_FIELDS if field in plant})
+        entry['version'] = 1
+        seed_history(entry)
+        entries.append(entry)
+    # Written even when empty so this only ever runs once
+    storage = JsonStorage(gardens.path(DEFAULT_USER), kind='garden')
+    with storage.file_lock.hold():
+        storage.save_all(entries)
+    return len(entries)
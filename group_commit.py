@@ -0,0 +1,164 @@
+"""Group commit: concurrent writes to one store persisted together.
+
+A writer that finds no commit in progress leads one: it takes every
+pending submission (up to ``max_operations`` operations) and applies
+them with a single ``apply_batch`` call, so a single storage write and
+fsync. Writers arriving meanwhile queue up, and the first of them leads
+the next commit with whatever has gathered by then. Under a burst of
+writes, each storage write carries many of them; a lone write goes
+straight through. ``window`` makes each leader wait that many seconds
+before taking the queue, trading latency for larger groups. Under gevent
+it is what makes groups form at all: file writes block the whole worker,
+so nobody can join a commit while it is being written. Left unset, it is
+GEVENT_WINDOW once gevent has patched threading and 0 otherwise, since
+sync workers never have two writers and threads overlap without it.
+
+A commit whose ``apply_batch`` raises Unwritten is retried one
+submission at a time, so a writer whose operations can't be applied
+fails alone rather than taking the rest of its group down with it. Any
+other error may have come after the storage write, so it is handed to
+every writer in the group as it is; trying again could write their
+operations twice.
+
+Every writer gets its results only once the commit carrying them has
+returned, so an acknowledged write is exactly as durable as a direct
+``apply_batch``. The JSON files and the event log fsync each write. SQLite
+in WAL mode with synchronous=NORMAL survives a crash of the app but can
+lose the last commits on power loss.
+
+Grouping only happens between writers in the same process, which needs
+gevent or threaded workers. Separate workers still take turns on the
+storage's file lock.
+"""
+import threading
+import time
+
+try:
+    from gevent import monkey
+except ImportError:
+    monkey = None
+
+import metrics
+
+# Most operations taken into one commit; a single larger submission
+# still goes in on its own
+MAX_GROUP_OPERATIONS = 1000
+
+# Default window where gevent has patched threading
+GEVENT_WINDOW = 0.002
+
+
+def default_window():
+    if monkey is not None and monkey.is_module_patched('threading'):
+        return GEVENT_WINDOW
+    return 0.0
+
+
+class Unwritten(Exception):
+    """Raised by ``apply_batch`` for an ``error`` that struck before anything was written"""
+
+    def __init__(self, error):
+        super().__init__(error)
+        self.error = error
+
+
+class Submission:
+    """One writer's operations, waiting to be committed"""
+
+    def __init__(self, operations):
+        self.operations = operations
+        self.results = None
+        self.error = None
+        # Set when committed, or when this writer is to lead the next commit
+        self.ready = threading.Event()
+        self.lead = False
+
+
+class GroupCommit:
+    """Funnels ``apply_batch(operations)`` calls for one store into shared commits.
+
+    ``name`` labels the store in the commit metrics. ``window`` is in
+    seconds, or None for default_window().
+    """
+
+    def __init__(self, apply_batch, name, window=None, max_operations=MAX_GROUP_OPERATIONS):
+        self._apply_batch = apply_batch
+        self.name = name
+        self.window = window
+        self.max_operations = max_operations
+        self._lock = threading.Lock()
+        self._queue = []
+        self._committing = False
+
+    def submit(self, operations):
+        """Apply ``operations`` in the next commit; returns their results once it is written"""
+        submission = Submission(operations)
+        with self._lock:
+            self._queue.append(submission)
+            submission.lead = not self._committing
+            self._committing = True
+        if not submission.lead:
+            submission.ready.wait()
+        if submission.lead:
+            self._commit()
+        if submission.error is not None:
+            raise submission.error
+        return submission.results
+
+    def _take(self):
+        """Pending submissions for one commit, oldest first"""
+        with self._lock:
+            count, total = 0, 0
+            for submission in self._queue:
+                total += len(submission.operations)
+                if count and total > self.max_operations:
+                    break
+                count += 1
+            group = self._queue[:count]
+            del self._queue[:count]
+            return group
+
+    def _apply(self, group):
+        """Apply ``group`` with one apply_batch call, handing out its results or error.
+
+        Returns True if it failed without writing anything.
+        """
+        operations = [operation for submission in group for operation in submission.operations]
+        try:
+            results = self._apply_batch(operations)
+        except Unwritten as e:
+            for submission in group:
+                submission.error = e.error
+            return True
+        except BaseException as e:
+            for submission in group:
+                submission.error = e
+            return False
+        start = 0
+        for submission in group:
+            submission.results = results[start:start + len(submission.operations)]
+            start += len(submission.operations)
+        metrics.inc('ecobloom_commits_total', store=self.name)
+        metrics.inc('ecobloom_committed_operations_total', len(operations), store=self.name)
+        return False
+
+    def _commit(self):
+        """Commit the queue's head as its leader, then hand over to the next writer"""
+        window = default_window() if self.window is None else self.window
+        if window:
+            time.sleep(window)
+        group = self._take()
+        # The stores drop whatever a failed apply_batch staged, so a group
+        # that wrote nothing can be tried again one writer at a time
+        if self._apply(group) and len(group) > 1:
+            for submission in group:
+                submission.error = None
+                self._apply([submission])
+        with self._lock:
+            if self._queue:
+                self._queue[0].lead = True
+                self._queue[0].ready.set()
+            else:
+                self._committing = False
+        for submission in group:
+            submission.ready.set()
@@ -0,0 +1,397 @@
+"""Plant images fetched once, resized once per size and kept on local disk.
+
+Originals are downloaded and thumbnails rendered in worker processes, at
+most ``workers`` at a time, so decoding large photos never holds up
+request handling. Each render is a short-lived ``python image_cache.py``
+process rather than a multiprocessing pool, whose pipes would block a
+gevent worker's event loop. Everything is kept under one directory with a
+size cap; the least recently used files are evicted first. Thumbnailing
+needs Pillow; without it originals are served as they are.
+"""
+import hashlib
+import html
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Widths thumbnails are rendered at; requests for anything else are refused
+# so the cache can't be filled with arbitrary sizes
+IMAGE_SIZES = (80, 160, 400, 600, 800, 1200)
+DEFAULT_IMAGE_SIZE = 400
+
+JPEG_QUALITY = 80
+MAX_ORIGINAL_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT = 10
+MAX_REDIRECTS = 5
+RENDER_TIMEOUT = 30
+
+# Failed origins aren't asked again for this long
+FAILURE_TTL = 300
+
+# Cache hits refresh a file's mtime, which eviction goes by, at most this often
+TOUCH_INTERVAL = 3600
+
+# Leading bytes of the formats originals are served as without Pillow
+IMAGE_MAGIC = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF8', 'image/gif'),
+)
+
+# Eviction brings the cache down to this share of its cap, so it
+# doesn't run again on the very next write
+EVICT_TO = 0.9
+
+# Files written or used this recently are never evicted, so a request
+# can't lose the thumbnail it is about to send
+EVICT_MIN_AGE = 60
+
+
+class ImageError(Exception):
+    """Raised when an image can't be fetched or decoded"""
+
+
+def check_public_url(url):
+    """Refuse URLs that aren't http(s) or that point into a private network.
+
+    Returns the address that was checked, for the connection to use: the
+    host name could resolve somewhere else by the time it is looked up again.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ImageError(f"Unsupported image URL: {url}")
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, parts.port, proto=socket.IPPROTO_TCP)
+    except (OSError, ValueError) as e:
+        raise ImageError(f"Can't resolve {parts.hostname}: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address[4][0].split('%')[0])
+        if not ip.is_global:
+            raise ImageError(f"Refusing to fetch from non-public address {ip}")
+    return addresses[0][4][0]
+
+
+def pinned(connection_class, address):
+    """``connection_class`` connecting to ``address`` rather than resolving its host.
+
+    The host name is still what goes in the Host header and is checked
+    against the TLS certificate.
+    """
+    def connection(host, **kwargs):
+        conn = connection_class(host, **kwargs)
+        if address is not None:
+            conn._create_connection = lambda host_port, *args: socket.create_connection((address, host_port[1]), *args)
+        return conn
+    return connection
+
+
+class PinnedHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(pinned(http.client.HTTPConnection, req.address), req)
+
+
+class PinnedHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(pinned(http.client.HTTPSConnection, req.address), req, context=self._context)
+
+
+class CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follows redirects only to URLs that pass the same checks as the first"""
+    max_redirections = MAX_REDIRECTS
+
+    def __init__(self, allow_private):
+        self.allow_private = allow_private
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        new = super().redirect_request(req, fp, code, msg, headers, newurl)
+        if new is not None:
+            new.address = None if self.allow_private else check_public_url(new.full_url)
+        return new
+
+
+def open_url(url, allow_private=False):
+    """Open ``url`` for reading, connecting only to addresses that were checked.
+
+    Every redirect is checked like the first URL. Proxies from the
+    environment aren't used, since the connection goes straight to the
+    checked address.
+    """
+    request = urllib.request.Request(url, headers={'User-Agent': 'EcoBloom image cache'})
+    request.address = None if allow_private else check_public_url(url)
+    opener = urllib.request.build_opener(
+        urllib.request.ProxyHandler({}), PinnedHTTPHandler(), PinnedHTTPSHandler(),
+        CheckedRedirectHandler(allow_private))
+    return opener.open(request, timeout=FETCH_TIMEOUT)
+
+
+def write_file(path, data):
+    """Write ``data`` to ``path`` atomically, so readers never see half a file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def fetch_original(url, path, allow_private=False):
+    """Download ``url`` to ``path`` unless an earlier request already did"""
+    if os.path.exists(path):
+        return
+    try:
+        with open_url(url, allow_private) as response:
+            data = response.read(MAX_ORIGINAL_BYTES + 1)
+    except (OSError, ValueError) as e:
+        raise ImageError(f"Can't fetch {url}: {e}")
+    if len(data) > MAX_ORIGINAL_BYTES:
+        raise ImageError(f"{url} is larger than {MAX_ORIGINAL_BYTES} bytes")
+    write_file(path, data)
+
+
+def render_thumbnail(url, size, original_path, thumbnail_path, allow_private=False):
+    """Fetch ``url`` if needed and write a JPEG ``size`` pixels wide.
+
+    Runs in a render process. Images are only ever scaled down, and very
+    tall ones are cropped to twice the width.
+    """
+    fetch_original(url, original_path, allow_private)
+    if Image is None:
+        # Served as it is, so it had better be an image
+        if not is_image(original_path):
+            raise ImageError(f"{url} is not a JPEG, PNG, GIF or WebP image")
+        return original_path
+    try:
+        with Image.open(original_path) as image:
+            image.draft('RGB', (size, size))
+            image = image.convert('RGB')
+            if image.width > size:
+                image = image.resize((size, round(image.height * size / image.width)), Image.LANCZOS)
+            if image.height > 2 * size:
+                image = image.crop((0, 0, image.width, 2 * size))
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    except OSError as e:
+        raise ImageError(f"Can't read the image from {url}: {e}")
+    write_file(thumbnail_path, buffer.getvalue())
+    return thumbnail_path
+
+
+def image_type(path):
+    """Mimetype of a cached image, from its first bytes"""
+    with open(path, 'rb') as f:
+        head = f.read(12)
+    for magic, mimetype in IMAGE_MAGIC:
+        if head.startswith(magic):
+            return mimetype
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+def is_image(path):
+    """Whether a cached file is in one of the formats image_type recognises"""
+    return image_type(path) != 'application/octet-stream'
+
+
+def placeholder_svg(name, size):
+    """A generated stand-in for plants without a usable image"""
+    # Same plant, same colour
+    hue = int(hashlib.md5(name.encode()).hexdigest()[:4], 16) % 360
+    height = size * 3 // 4
+    font_size = max(size // 12, 8)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{height}" viewBox="0 0 {size} {height}">'
+        f'<rect width="100%" height="100%" fill="hsl({hue},35%,82%)"/>'
+        f'<text x="50%" y="50%" dominant-baseline="middle" text-anchor="middle" '
+        f'font-family="sans-serif" font-size="{font_size}" fill="hsl({hue},40%,30%)">{html.escape(name)}</text>'
+        f'</svg>'
+    )
+
+
+class ImageCache:
+    """Thumbnails of remote images in ``directory``, kept under ``max_bytes``.
+
+    Files are named after a hash of the source URL, so a plant whose image
+    changes gets fresh files and the old ones age out. Concurrent requests
+    for the same thumbnail share one render. ``origin`` replaces the scheme
+    and host of every image URL, to test against a local stand-in server
+    instead of the real hosts.
+    """
+
+    def __init__(self, directory, max_bytes, workers=2, origin=None, allow_private=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.origin = origin
+        # Private addresses are only fetched from when pointed at a stand-in
+        self.allow_private = allow_private or origin is not None
+        self._lock = threading.Lock()
+        self._workers = threading.BoundedSemaphore(workers)
+        # (url, size) -> Event set when the render in progress finishes
+        self._rendering = {}
+        # url -> when it last failed
+        self._failures = {}
+        self._used = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _source_url(self, url):
+        if not self.origin:
+            return url
+        parts = urllib.parse.urlsplit(url)
+        origin = urllib.parse.urlsplit(self.origin)
+        return urllib.parse.urlunsplit((origin.scheme, origin.netloc, parts.path, parts.query, ''))
+
+    def _paths(self, url, size):
+        key = hashlib.sha1(url.encode()).hexdigest()
+        return (os.path.join(self.directory, f"{key}.orig"),
+                os.path.join(self.directory, f"{key}-{size}.jpg"))
+
+    def _render(self, url, size, original_path, thumbnail_path):
+        """Run render_thumbnail in a process of its own; returns the path it wrote"""
+        command = [sys.executable, os.path.abspath(__file__),
+                   self._source_url(url), str(size), original_path, thumbnail_path]
+        if self.allow_private:
+            command.append('--allow-private')
+        with self._workers:
+            try:
+                result = subprocess.run(command, capture_output=True, text=True, timeout=RENDER_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                raise ImageError(f"Rendering {url} took over {RENDER_TIMEOUT}s")
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            raise ImageError(lines[-1] if lines else f"Rendering {url} failed")
+        return result.stdout.strip()
+
+    def _cached(self, url, size):
+        """Path of an already cached image for ``url`` at ``size``, or None"""
+        original_path, thumbnail_path = self._paths(url, size)
+        if self._touch(thumbnail_path):
+            return thumbnail_path
+        # Without Pillow an original is sent as fetched, but never if it
+        # isn't an image
+        if Image is None and self._touch(original_path) and is_image(original_path):
+            return original_path
+        return None
+
+    def thumbnail(self, url, size):
+        """Path of the thumbnail of ``url`` at width ``size``, or None if there is no usable image"""
+        if not url:
+            return None
+        while True:
+            path = self._cached(url, size)
+            if path is not None:
+                return path
+            with self._lock:
+                failed_at = self._failures.get(url)
+                if failed_at is not None and time.time() - failed_at < FAILURE_TTL:
+                    return None
+                pending = self._rendering.get((url, size))
+                rendering = pending is None
+                if rendering:
+                    pending = self._rendering[url, size] = threading.Event()
+            if not rendering:
+                # Look again once the render in progress is done
+                pending.wait()
+                continue
+            try:
+                path = self._render(url, size, *self._paths(url, size))
+            except ImageError:
+                with self._lock:
+                    self._failures[url] = time.time()
+                return None
+            finally:
+                with self._lock:
+                    del self._rendering[url, size]
+                pending.set()
+            self._added(*self._paths(url, size))
+            return path
+
+    def _touch(self, path):
+        """Mark a cached file as recently used; False if it isn't cached"""
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return False
+        now = time.time()
+        if now - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:
+                return False
+        return True
+
+    def _scan(self):
+        """Cached files as (mtime, size, path), oldest first"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.tmp-'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        return files
+
+    def _added(self, *paths):
+        """Count newly written files and evict the oldest ones if over the cap.
+
+        Other workers write to the same directory, so the running total is
+        only an estimate between the directory scans it triggers.
+        """
+        added = 0
+        for path in paths:
+            try:
+                added += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            if self._used is not None:
+                self._used += added
+                if self._used <= self.max_bytes:
+                    return
+            files = self._scan()
+            used = sum(size for _, size, _ in files)
+            recent = time.time() - EVICT_MIN_AGE
+            for mtime, size, path in files:
+                if used <= self.max_bytes * EVICT_TO or mtime > recent:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                used -= size
+            self._used = used
+
+
+def main():
+    """Render one thumbnail; used by ImageCache for its worker processes"""
+    args = sys.argv[1:]
+    allow_private = '--allow-private' in args
+    if allow_private:
+        args.remove('--allow-private')
+    url, size, original_path, thumbnail_path = args
+    try:
+        print(render_thumbnail(url, int(size), original_path, thumbnail_path, allow_private))
+    except ImageError as e:
+        sys.exit(str(e))
+
+
+if __name__ == '__main__':
+    main()
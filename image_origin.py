@@ -0,0 +1,64 @@
+"""Local stand-in for the remote image hosts, for testing the image cache.
+
+Answers every path with a generated JPEG (the same one each time for the
+same path), optionally after a delay to mimic a slow CDN:
+
+    python image_origin.py --port 8001 --delay 200
+    ECOBLOOM_IMAGE_ORIGIN=http://127.0.0.1:8001 python EcoBloom.py
+
+Paths starting with /missing/ answer 404, to exercise the placeholders.
+"""
+import argparse
+import hashlib
+import io
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image, ImageDraw
+
+
+def generate_image(path, width, height):
+    """A JPEG in a colour picked from ``path``, with the path written on it"""
+    digest = hashlib.md5(path.encode()).digest()
+    image = Image.new('RGB', (width, height), tuple(digest[:3]))
+    draw = ImageDraw.Draw(image)
+    for i in range(0, width, 40):
+        draw.line((i, 0, i + height, height), fill=tuple(digest[3:6]), width=8)
+    draw.text((10, 10), path[:80], fill=(255, 255, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def make_handler(width, height, delay):
+    class OriginHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            if self.path.startswith('/missing/'):
+                self.send_error(404)
+                return
+            body = generate_image(self.path, width, height)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return OriginHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve generated images in place of the real image hosts')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--width', type=int, default=1200)
+    parser.add_argument('--height', type=int, default=800)
+    parser.add_argument('--delay', type=int, default=0, help='milliseconds to wait before each response')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.width, args.height, args.delay / 1000))
+    print(f"Serving images on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""Request and storage metrics, added up across gunicorn workers.
+
+Every process counts into its own registry and writes it out as
+``<directory>/<parent pid>-<pid>.json`` every FLUSH_INTERVAL seconds. The
+parent of a gunicorn worker is the master, so /metrics adds up the files
+of every worker the master has run, including ones it has since replaced;
+files left by earlier servers are deleted once their master has exited.
+Counters and histograms are summed and gauges come from whichever process
+set them last. Rendered in the Prometheus text format.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# How often each process writes out its registry, and so how far behind
+# other workers' numbers can be
+FLUSH_INTERVAL = 5
+
+METRICS = {
+    'ecobloom_http_requests_total': ('counter', 'Requests handled, by route, method and status'),
+    'ecobloom_http_request_duration_seconds': ('histogram', 'Time spent handling requests, by route and method'),
+    'ecobloom_http_response_bytes_total': ('counter', 'Response body bytes sent, by route'),
+    'ecobloom_rejected_requests_total': ('counter', 'Requests turned away, by reason'),
+    'ecobloom_storage_seconds': (
+        'histogram', 'Time spent in storage, by store (catalog or garden) and operation '
+                     '(read, parse, replay, serialize or write)'),
+    'ecobloom_storage_bytes_total': ('counter', 'Bytes read from and written to storage, by store and operation'),
+    'ecobloom_catalog_reload_seconds': ('histogram', 'Time spent reloading the catalog, indexes included'),
+    'ecobloom_index_rebuild_seconds': ('histogram', 'Time spent rebuilding each catalog index'),
+    'ecobloom_index_errors_total': ('counter', 'Written events an index failed to apply, left for a rebuild'),
+    'ecobloom_commits_total': ('counter', 'Storage writes made by group commit, by store'),
+    'ecobloom_committed_operations_total': ('counter', 'Operations those writes carried, by store'),
+    'ecobloom_catalog_plants': ('gauge', 'Plants in the catalog'),
+    'ecobloom_catalog_revision': ('gauge', 'Catalog revision'),
+    'ecobloom_catalog_stored_bytes': ('gauge', 'Size of the catalog in storage'),
+}
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def new_histogram():
+    """Count per bucket (the last one for +Inf), then the sum"""
+    return [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+
+
+def add_histogram(total, histogram):
+    for i, value in enumerate(histogram):
+        total[i] += value
+
+
+def format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+class Registry:
+    """One process's metrics, and the merged view of every worker's.
+
+    Values are kept by ``(name, labels)``: numbers for counters, ``[value,
+    time set]`` for gauges and bucket counts for histograms. Without a
+    directory only this process is counted.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._values = {}
+        self._pid = None
+        self._dirty = False
+
+    def configure(self, directory):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _own_values(self):
+        """This process's values, starting afresh in a newly forked worker"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._values = {}
+            if self.directory:
+                threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True).start()
+                atexit.register(self.flush)
+        self._dirty = True
+        return self._values
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            values = self._own_values()
+            key = (name, label_key(labels))
+            values[key] = values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._own_values()[name, label_key(labels)] = [value, time.time()]
+
+    def observe(self, name, seconds, **labels):
+        with self._lock:
+            values = self._own_values()
+            key = (name, label_key(labels))
+            histogram = values.get(key)
+            if histogram is None:
+                histogram = values[key] = new_histogram()
+            bucket = len(LATENCY_BUCKETS)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    bucket = i
+                    break
+            histogram[bucket] += 1
+            histogram[-1] += seconds
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe how long the block takes"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{os.getppid()}-{pid}.json")
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """Write this process's values for the other workers to read"""
+        with self._lock:
+            if not self._dirty or self._pid != os.getpid():
+                return
+            data = json.dumps([[name, dict(labels), value] for (name, labels), value in self._values.items()])
+            self._dirty = False
+        path = self._path(self._pid)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _worker_files(self):
+        """Snapshot files written by the other workers of this server"""
+        group = f"{os.getppid()}-"
+        own = os.path.basename(self._path(os.getpid()))
+        paths = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json') or name == own:
+                continue
+            if name.startswith(group):
+                paths.append(os.path.join(self.directory, name))
+                continue
+            # Left behind by a server that has since exited
+            try:
+                os.kill(int(name.split('-')[0]), 0)
+            except ProcessLookupError:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+            except (ValueError, PermissionError):
+                pass
+        return paths
+
+    def collect(self):
+        """Every worker's values merged, by ``(name, labels)``"""
+        with self._lock:
+            snapshots = [list(self._values.items()) if self._pid == os.getpid() else []]
+        if self.directory:
+            for path in self._worker_files():
+                try:
+                    with open(path) as f:
+                        snapshots.append([((name, label_key(labels)), value) for name, labels, value in json.load(f)])
+                except (FileNotFoundError, ValueError):
+                    continue
+        merged = {}
+        for snapshot in snapshots:
+            for key, value in snapshot:
+                kind = METRICS[key[0]][0]
+                if kind == 'counter':
+                    merged[key] = merged.get(key, 0) + value
+                elif kind == 'gauge':
+                    if key not in merged or value[1] > merged[key][1]:
+                        merged[key] = value
+                else:
+                    add_histogram(merged.setdefault(key, new_histogram()), value)
+        return merged
+
+    def render(self):
+        """Every worker's metrics in the Prometheus text exposition format"""
+        by_name = {}
+        for (name, labels), value in sorted(self.collect().items()):
+            by_name.setdefault(name, []).append((dict(labels), value))
+        lines = []
+        for name, series in by_name.items():
+            kind, help_text = METRICS[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in series:
+                if kind == 'counter':
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+                elif kind == 'gauge':
+                    lines.append(f"{name}{format_labels(labels)} {value[0]}")
+                else:
+                    cumulative = 0
+                    for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), value):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{format_labels(labels, le=bound)} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {round(value[-1], 6)}")
+                    lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+
+# The registry everything in this process counts into
+registry = Registry()
+
+configure = registry.configure
+inc = registry.inc
+set_gauge = registry.set
+observe = registry.observe
+timer = registry.timer
+render = registry.render
@@ -0,0 +1,401 @@
+"""In-memory plant catalog backed by a storage backend"""
+import bisect
+import json
+import threading
+import zlib
+from contextlib import contextmanager
+
+import metrics
+from group_commit import GroupCommit, Unwritten
+
+# Change records kept for clients catching up on what they missed
+CHANGE_LOG_SIZE = 1000
+
+# Stands in for the storage signature when what is in memory has to be
+# reloaded; it matches no signature, not even None for a missing file
+STALE = object()
+
+# Per-user fields older catalogs kept on every plant; gardens hold them now
+GARDEN_FIELDS = ('saved', 'last_watered', 'watering_day', 'watering_status')
+
+# Catalog fields a plant edit may change
+EDITABLE_FIELDS = (
+    'name', 'scientific_name', 'image', 'watering_frequency', 'watering_times',
+    'sunlight', 'soil', 'fertilizer', 'growth_type', 'care_tips'
+)
+
+# What UTF-8 text looks like after being decoded as Windows-1252 once,
+# as some of the text in plants.json was ("2â€“3 weeks")
+MOJIBAKE_MARKERS = ('â€', 'Ã', 'Â')
+
+
+def fix_mojibake(text):
+    """Undo one round of UTF-8 read as Windows-1252; other text is returned as is"""
+    if not isinstance(text, str) or not any(marker in text for marker in MOJIBAKE_MARKERS):
+        return text
+    try:
+        return text.encode('cp1252').decode('utf-8')
+    except UnicodeError:
+        return text
+
+
+def build_plant(data):
+    """Build a plant record from submitted form data; the store assigns the id"""
+    data = {key: fix_mojibake(value) for key, value in data.items()}
+    return {
+        "id": None,
+        "name": data.get('name'),
+        "scientific_name": data.get('scientific_name', ''),
+        "image": data.get('image', ''),
+        "watering_frequency": data.get('watering_frequency', ''),
+        "watering_times": data.get('watering_times', []),
+        "sunlight": data.get('sunlight', ''),
+        "soil": data.get('soil', ''),
+        "fertilizer": data.get('fertilizer', ''),
+        "growth_type": data.get('growth_type', ''),
+        "care_tips": data.get('care_tips', '')
+    }
+
+
+class VersionConflict(Exception):
+    """Raised when a write names a plant version that is no longer current"""
+
+    def __init__(self, plant):
+        super().__init__(f"Plant {plant['id']} is at version {plant['version']}")
+        self.plant = plant
+
+
+def apply_event(plants, event):
+    """Apply one change event to a dict of plants keyed by id.
+
+    Every mutation goes through here, both for live requests and when a
+    backend replays its log. Each plant it touches gets its version bumped.
+    Returns the affected plant, if any.
+
+    Only add and edit are issued now. Save, remove, water and reset come
+    from logs written while the garden lived on the catalog, and are still
+    replayed so that garden can be migrated.
+    """
+    op = event['op']
+    if op == 'add':
+        plant = event['plant']
+        plant['version'] = 1
+        plants[plant['id']] = plant
+        return plant
+    if op == 'reset':
+        for plant in plants.values():
+            plant['watering_status'] = {"morning": False, "evening": False}
+            plant['version'] = plant.get('version', 1) + 1
+        return None
+
+    plant = plants.get(event['id'])
+    if plant is None:
+        return None
+    if op == 'save':
+        plant['saved'] = True
+    elif op == 'remove':
+        plant['saved'] = False
+        plant['watering_status'] = {"morning": False, "evening": False}
+    elif op == 'water':
+        day = event['at'][:10]
+        if plant.get('watering_day') != day:
+            plant['watering_day'] = day
+            plant['watering_status'] = {"morning": False, "evening": False}
+        plant['watering_status'][event['time']] = True
+        plant['last_watered'] = event['at']
+    elif op == 'edit':
+        plant.update(event['fields'])
+    else:
+        raise ValueError(f"Unknown event: {op}")
+    plant['version'] = plant.get('version', 1) + 1
+    return plant
+
+
+class PlantStore:
+    """Keeps the plant catalog parsed in memory, indexed by id.
+
+    The backend is only re-read when its signature changes (the file's
+    mtime/size for plants.json), so edits made outside the app or by other
+    gunicorn workers still show up on the next request. Writes hold the
+    backend's cross-process file lock and reload first, so concurrent
+    workers never overwrite each other's changes.
+
+    The catalog is the same for everyone; each user's saved plants and
+    watering live in their own Garden (see garden_store).
+
+    Every change is also kept as a small JSON record tagged with its
+    revision, so clients can follow the catalog without reloading it.
+    Changes made by other workers show up as "update" records for each
+    plant whose version moved when the catalog is reloaded.
+    """
+
+    def __init__(self, storage, commit_window=None):
+        self.storage = storage
+        # Concurrent apply_batch calls share storage writes
+        self._commits = GroupCommit(self._apply_now, 'catalog', commit_window)
+        self.lock = threading.RLock()
+        self.revision = 0
+        # (revision, plant id, JSON record), complete for revisions after _changes_from
+        self._changes = []
+        self._changes_from = 0
+        self._plants = {}
+        # Plant ids in ascending order, for cursor pagination
+        self._ids = []
+        self._next_id = 1
+        self._fingerprint = 0
+        self._indexes = []
+        self._signature = None
+        self._loaded = False
+
+    def refresh(self):
+        """Reload plants from storage if it changed since the last read"""
+        signature = self.storage.signature()
+        if self._loaded and signature == self._signature:
+            return
+        with self.lock, self.storage.file_lock.hold(shared=True), metrics.timer('ecobloom_catalog_reload_seconds'):
+            # Take the signature before reading so a write that lands in
+            # between is picked up on the next refresh instead of being missed
+            signature = self.storage.signature()
+            plants = self.storage.load()
+            for plant in plants:
+                # Catalogs written before plants were versioned
+                plant.setdefault('version', 1)
+                # or before gardens moved out of the catalog
+                for field in GARDEN_FIELDS:
+                    plant.pop(field, None)
+                for field in EDITABLE_FIELDS:
+                    if field in plant:
+                        plant[field] = fix_mojibake(plant[field])
+            plants.sort(key=lambda plant: plant['id'])
+            previous, previous_revision = self._plants, self.revision
+            self._plants = {plant['id']: plant for plant in plants}
+            self._ids = list(self._plants)
+            self._next_id = self._ids[-1] + 1 if self._ids else 1
+            self.revision = self.storage.revision
+            # Edits made outside the app may not bump the revision, so the
+            # ETag also covers what was actually loaded
+            self._fingerprint = zlib.crc32(json.dumps(plants).encode())
+            if not self._loaded or self.revision < previous_revision:
+                # First load, or storage was replaced with an older catalog
+                self._changes = []
+                self._changes_from = self.revision
+            else:
+                for plant in plants:
+                    old = previous.get(plant['id'])
+                    if old is None or old['version'] != plant['version']:
+                        self._record_change(self.revision, 'add' if old is None else 'update', plant)
+            for index in self._indexes:
+                with metrics.timer('ecobloom_index_rebuild_seconds', index=type(index).__name__):
+                    index.rebuild(self._plants)
+            # Only now, so an index that failed to rebuild is tried again
+            self._signature = signature
+            self._loaded = True
+
+    def _record_change(self, revision, op, plant):
+        """Keep a change record for changes_since(), dropping the oldest"""
+        record = json.dumps({"rev": revision, "op": op, "plant": plant})
+        self._changes.append((revision, plant['id'], record))
+        if len(self._changes) > CHANGE_LOG_SIZE:
+            dropped = self._changes[:len(self._changes) - CHANGE_LOG_SIZE // 2]
+            del self._changes[:len(dropped)]
+            self._changes_from = dropped[-1][0]
+
+    def changes_since(self, revision):
+        """Change records after ``revision``, with the revision they bring it to.
+
+        Returns ``(current_revision, [(revision, plant_id, json), ...])``. The list is
+        None when the records no longer reach back that far (or
+        ``revision`` is from a catalog that was replaced), in which case
+        the caller has to reload the whole catalog.
+        """
+        self.refresh()
+        with self.lock:
+            if revision < self._changes_from or revision > self.revision:
+                return self.revision, None
+            start = bisect.bisect_left(self._changes, (revision + 1,))
+            return self.revision, self._changes[start:]
+
+    def changed_since(self, revision):
+        """Current state of every plant changed after ``revision``, in id order.
+
+        Returns ``(current_revision, plants)``, with plants None when the
+        change records no longer reach back to ``revision``.
+        """
+        current, changes = self.changes_since(revision)
+        if changes is None:
+            return current, None
+        with self.lock:
+            plant_ids = sorted({plant_id for _, plant_id, _ in changes})
+            return current, [self._plants[plant_id] for plant_id in plant_ids]
+
+    def add_index(self, index):
+        """Keep ``index`` in step with the catalog.
+
+        Indexes get ``rebuild(plants)`` with the plants dict whenever the
+        catalog is (re)loaded and ``apply(event, plant)`` after each commit.
+        """
+        with self.lock:
+            self._indexes.append(index)
+            if self._loaded:
+                index.rebuild(self._plants)
+
+    @contextmanager
+    def writing(self):
+        """Hold the process and cross-process write locks on fresh data"""
+        with self.lock, self.storage.file_lock.hold():
+            self.refresh()
+            yield
+
+    def _stage(self, event):
+        """Apply an event to the in-memory catalog ahead of _persist()"""
+        plant = apply_event(self._plants, event)
+        if event['op'] == 'add':
+            self._ids.append(plant['id'])
+        return plant
+
+    def _persist(self, staged):
+        """Write staged ``(event, plant)`` pairs with a single storage call"""
+        self.storage.record([event for event, plant in staged], self._plants)
+        indexed = self._apply_to_indexes(staged)
+        first_revision = self.storage.revision - len(staged) + 1
+        for revision, (event, plant) in enumerate(staged, first_revision):
+            if plant is not None:
+                self._record_change(revision, event['op'], plant)
+        self.revision = self.storage.revision
+        # Our own writes must not look like an outside edit, unless an
+        # index fell behind and needs the reload to catch up
+        self._signature = self.storage.signature() if indexed else STALE
+
+    def _apply_to_indexes(self, staged):
+        """Bring the indexes up to date with written events; False if one failed.
+
+        The write already happened, so a failing index must not fail it;
+        the caller reloads instead, which rebuilds every index.
+        """
+        ok = True
+        for index in self._indexes:
+            try:
+                for event, plant in staged:
+                    index.apply(event, plant)
+            except Exception:
+                metrics.inc('ecobloom_index_errors_total', index=type(index).__name__)
+                ok = False
+        return ok
+
+    def catalog_etag(self):
+        """Validator for the whole catalog; changes with every commit or reload"""
+        self.refresh()
+        return f"{self.revision}-{self._fingerprint:x}"
+
+    def all(self):
+        """Return every plant in id order"""
+        self.refresh()
+        return list(self._plants.values())
+
+    def page(self, after=0, limit=None):
+        """Return up to ``limit`` plants with ids above ``after``.
+
+        Also returns the cursor for the next page, or None on the last one.
+        """
+        self.refresh()
+        with self.lock:
+            start = bisect.bisect_right(self._ids, after)
+            end = len(self._ids) if limit is None else start + limit
+            page_ids = self._ids[start:end]
+            plants = [self._plants[plant_id] for plant_id in page_ids]
+            has_more = end < len(self._ids)
+        return plants, (page_ids[-1] if has_more and page_ids else None)
+
+    def get(self, plant_id):
+        """Return one plant by id, or None"""
+        self.refresh()
+        return self._plants.get(plant_id)
+
+    def _check_version(self, plant_id, if_match):
+        """Return the plant, or raise VersionConflict if ``if_match`` is stale.
+
+        ``if_match`` is a collection of acceptable versions as strings, or
+        None to skip the check.
+        """
+        plant = self._plants.get(plant_id)
+        if plant is not None and if_match is not None and str(plant['version']) not in if_match:
+            raise VersionConflict(plant)
+        return plant
+
+    def _event_for(self, operation):
+        """Turn a requested operation into an event, or None if the plant is missing"""
+        op = operation['op']
+        if op == 'add':
+            plant = operation['plant']
+            plant['id'] = self._next_id
+            self._next_id += 1
+            return {"op": "add", "plant": plant}
+
+        plant_id = operation['id']
+        if self._check_version(plant_id, operation.get('if_match')) is None:
+            return None
+        if op == 'edit':
+            fields = {key: fix_mojibake(value) for key, value in operation['fields'].items()
+                      if key in EDITABLE_FIELDS}
+            return {"op": "edit", "id": plant_id, "fields": fields}
+        raise ValueError(f"Unknown operation: {op}")
+
+    def apply_batch(self, operations):
+        """Apply several operations and persist them with one storage write.
+
+        Operations are dicts with an ``op`` of add (with ``plant``) or edit
+        (with the plant ``id``, ``fields`` and an optional ``if_match``).
+        Returns one result per operation: a copy of the affected plant as
+        that operation left it, None if the plant does not exist, or the
+        VersionConflict that rejected it. Rejected operations are skipped
+        and the rest are written together, along with any other batches
+        submitted meanwhile (see group_commit).
+        """
+        return self._commits.submit(operations)
+
+    def _apply_now(self, operations):
+        results, staged = [], []
+        with self.writing():
+            try:
+                for operation in operations:
+                    try:
+                        event = self._event_for(operation)
+                    except VersionConflict as conflict:
+                        results.append(conflict)
+                        continue
+                    if event is None:
+                        results.append(None)
+                        continue
+                    plant = self._stage(event)
+                    staged.append((event, plant))
+                    results.append(dict(plant))
+            except Exception as e:
+                # Changes were staged on the live catalog; drop them by
+                # reloading on the next read
+                self._signature = STALE
+                raise Unwritten(e) from e
+            except BaseException:
+                self._signature = STALE
+                raise
+            if staged:
+                try:
+                    self._persist(staged)
+                except BaseException:
+                    self._signature = STALE
+                    raise
+        return results
+
+    def _apply_one(self, operation):
+        result = self.apply_batch([operation])[0]
+        if isinstance(result, VersionConflict):
+            raise result
+        return result
+
+    def add_plant(self, plant):
+        """Assign the next id to a new plant, store and persist it"""
+        return self._apply_one({"op": "add", "plant": plant})
+
+    def edit_plant(self, plant_id, fields, if_match=None):
+        """Change a plant's catalog fields; returns None if missing"""
+        return self._apply_one({"op": "edit", "id": plant_id, "fields": fields, "if_match": if_match})
+
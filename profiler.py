@@ -0,0 +1,187 @@
+"""Sampling profiler for single requests, written out as collapsed stacks.
+
+A profiled request gets a sampler thread that looks at the request
+thread's Python stack every few milliseconds and counts each distinct
+stack. The result is saved in the collapsed format flamegraph.pl,
+speedscope and inferno read (``outer;inner;innermost count`` per line),
+with a small JSON file of details alongside for /debug/profiles.
+
+Under gevent the sampler is a real OS thread, so it keeps sampling while
+the request runs; since every greenlet shares the worker's thread, the
+samples also catch whatever other requests run in the meantime.
+"""
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from collections import Counter
+
+from flask import g, request
+
+try:
+    from gevent import monkey
+except ImportError:
+    monkey = None
+
+if monkey is not None:
+    # The unpatched primitives, so the sampler isn't a greenlet that only
+    # runs when the request it profiles yields
+    start_new_thread = monkey.get_original('_thread', 'start_new_thread')
+    allocate_lock = monkey.get_original('_thread', 'allocate_lock')
+    get_ident = monkey.get_original('_thread', 'get_ident')
+    sleep = monkey.get_original('time', 'sleep')
+else:
+    from _thread import allocate_lock, get_ident, start_new_thread
+    from time import sleep
+
+# Captures kept in the profile directory; older ones are deleted
+MAX_PROFILES = 200
+
+# Stacks deeper than this are cut at the outermost frames
+MAX_DEPTH = 100
+
+PROFILE_ID_RE = re.compile(r'^[0-9]{17}-[0-9a-f]{8}$')
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+def collapsed_stack(frame):
+    """The stack ending at ``frame`` as ``outer;...;inner``"""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class Sampler:
+    """Counts the stacks one thread is seen in, every ``interval`` seconds"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._running = True
+        self._done = allocate_lock()
+        self._done.acquire()
+        start_new_thread(self._run, ())
+
+    def _run(self):
+        try:
+            while self._running:
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    self.stacks[collapsed_stack(frame)] += 1
+                del frame
+                sleep(self.interval)
+        finally:
+            self._done.release()
+
+    def stop(self):
+        """Stop sampling; returns the stack counts"""
+        self._running = False
+        self._done.acquire()
+        return self.stacks
+
+
+def new_profile_id():
+    """Capture time to the millisecond plus a random suffix"""
+    now = time.time()
+    stamp = time.strftime('%Y%m%d%H%M%S', time.localtime(now))
+    return f"{stamp}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}"
+
+
+class ProfileStore:
+    """Saved captures in ``directory``: ``<id>.folded`` plus ``<id>.json`` details.
+
+    Ids start with the capture time, so sorting them lists the newest last.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, details, stacks):
+        profile_id = new_profile_id()
+        details = dict(details, id=profile_id, samples=sum(stacks.values()))
+        path = os.path.join(self.directory, profile_id)
+        with open(f"{path}.folded", 'w') as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        with open(f"{path}.json", 'w') as f:
+            json.dump(details, f)
+        self._prune()
+        return details
+
+    def _ids(self):
+        return sorted(name[:-5] for name in os.listdir(self.directory)
+                      if name.endswith('.json') and PROFILE_ID_RE.match(name[:-5]))
+
+    def _prune(self):
+        for profile_id in self._ids()[:-MAX_PROFILES]:
+            for extension in ('.json', '.folded'):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + extension))
+                except FileNotFoundError:
+                    pass
+
+    def recent(self, limit):
+        """Details of the newest ``limit`` captures, newest first"""
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            if len(profiles) == limit:
+                break
+            try:
+                with open(os.path.join(self.directory, f"{profile_id}.json")) as f:
+                    profiles.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+        return profiles
+
+    def folded_path(self, profile_id):
+        """Path of a capture's collapsed stacks, or None if there is no such capture"""
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.folded")
+        return path if os.path.exists(path) else None
+
+
+def install(app, profiles, is_admin, sample_rate=0.0, interval=0.002):
+    """Profile requests to ``app`` that ask for it or are picked at ``sample_rate``.
+
+    A request asks with an ``X-Profile: 1`` header or ``?profile=1``, which
+    only count when ``is_admin()`` accepts the request; the capture's id
+    comes back in X-Profile-Id. Sampling stops once the response is built,
+    so streamed bodies (/export, /events) aren't covered. Only call this
+    when profiling is wanted: an app it was never installed on pays nothing.
+    """
+
+    @app.before_request
+    def start_profile():
+        asked = request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'
+        if (asked and is_admin()) or (sample_rate and random.random() < sample_rate):
+            g.profile_started = time.perf_counter()
+            g.profile_sampler = Sampler(get_ident(), interval)
+
+    @app.after_request
+    def finish_profile(response):
+        sampler = g.pop('profile_sampler', None)
+        if sampler is None:
+            return response
+        stacks = sampler.stop()
+        details = profiles.save({
+            "method": request.method,
+            "path": request.full_path.rstrip('?'),
+            "route": request.url_rule.rule if request.url_rule else None,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - g.profile_started) * 1000, 3),
+            "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "pid": os.getpid(),
+        }, stacks)
+        response.headers['X-Profile-Id'] = details['id']
+        return response
@@ -0,0 +1,128 @@
+"""Per-client token buckets shared by every worker, and a cap on requests in flight.
+
+Buckets live in a small memory-mapped file that all gunicorn workers
+map, so a client gets the same budget whichever worker answers it. Each
+slot holds a key hash, the tokens left and when they were last counted.
+Slots are found by hash with a short linear probe. When all probed slots
+are taken, the one idle longest is reused, and the client that had it
+starts again with a full bucket. Updates hold the file's flock, which is
+only ever held for a few microseconds.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: buckets are per process there
+    fcntl = None
+
+# key hash, tokens, last refill time
+SLOT = struct.Struct('<Qdd')
+SLOTS = 8192
+PROBE = 8
+
+
+def parse_budget(text):
+    """``"rate,burst"`` (requests per second, bucket size) as floats"""
+    rate, burst = (float(part) for part in text.split(','))
+    if rate <= 0 or burst < 1:
+        raise ValueError(f"Invalid rate limit budget: {text}")
+    return rate, burst
+
+
+def key_hash(key):
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+
+class TokenBuckets:
+    """Token buckets by key in the shared file at ``path``"""
+
+    def __init__(self, path, slots=SLOTS):
+        self.path = path
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _open(self):
+        """Map the file, once in each process"""
+        # A descriptor inherited across fork would share its flock with the parent
+        if self._pid == os.getpid():
+            return
+        size = self.slots * SLOT.size
+        if fcntl is None:
+            self._map = bytearray(size)
+        else:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size)
+        self._pid = os.getpid()
+
+    def take(self, key, rate, burst):
+        """Take a token from ``key``'s bucket.
+
+        Returns ``(allowed, retry_after)``, retry_after being the seconds
+        until a token will be available when there is none now.
+        """
+        wanted = key_hash(key)
+        first = wanted % self.slots
+        with self._lock:
+            self._open()
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                slot, oldest, oldest_time = None, None, None
+                for i in range(PROBE):
+                    index = (first + i) % self.slots
+                    found, tokens, last = SLOT.unpack_from(self._map, index * SLOT.size)
+                    if found == wanted:
+                        slot = index
+                        # A clock that went backwards counts as a full refill
+                        elapsed = now - last if now >= last else burst / rate
+                        tokens = min(burst, tokens + elapsed * rate)
+                        break
+                    if found == 0:
+                        # Slots are never emptied, so the key isn't further on
+                        oldest = index
+                        break
+                    if oldest is None or last < oldest_time:
+                        oldest, oldest_time = index, last
+                if slot is None:
+                    slot, tokens = oldest, burst
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                SLOT.pack_into(self._map, slot * SLOT.size, wanted, tokens, now)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+class InFlight:
+    """Counts this worker's requests in progress and turns away any over ``limit``"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def enter(self):
+        """Admit a request; False if the worker is already at its limit"""
+        with self._lock:
+            if self.count >= self.limit:
+                return False
+            self.count += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.count -= 1
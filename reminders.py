@@ -0,0 +1,144 @@
+"""Server-side watering reminders kept in a due-time priority queue"""
+import heapq
+import threading
+from datetime import date, datetime, time, timedelta
+
+from schedule import next_watering_day
+
+# Reminder window for each watering slot: (watering_times label, start, end)
+WINDOWS = {
+    'morning': ('Morning', time(6), time(10)),
+    'evening': ('Evening', time(17), time(20)),
+}
+
+
+def next_due(plant, entry, slot, now, schedule):
+    """When the next reminder for ``slot`` starts, or None if it has none.
+
+    ``plant`` is the catalog record, ``entry`` its garden entry and
+    ``schedule`` its compiled watering schedule. Between waterings the
+    schedule decides the day; once a plant has been watered in one slot
+    today, its other slots are due today too.
+    """
+    label, start, end = WINDOWS[slot]
+    if not entry['saved'] or label not in (plant.get('watering_times') or []):
+        return None
+    day = now.date()
+    watered_today = entry['watering_day'] == day.isoformat()
+    done = watered_today and entry['watering_status'].get(slot)
+    if done or now.time() >= end:
+        day += timedelta(days=1)
+    if entry.get('last_watered') and (done or not watered_today):
+        scheduled = next_watering_day(schedule, date.fromisoformat(entry['last_watered'][:10]))
+        day = max(day, scheduled)
+    return datetime.combine(day, start)
+
+
+class ReminderIndex:
+    """Min-heap of the next reminder time for every plant and slot in a garden.
+
+    Each heap item is ``(due_at, plant_id, slot)``; ``_scheduled`` holds the
+    current due time per plant and slot, and items that no longer match it
+    are dropped as they surface. Reading the due reminders only touches the
+    items that are due, plus the next one, whatever the garden size.
+    It is a Garden index: it rebuilds lazily after the garden reloads and
+    is updated in place as plants are saved, removed or watered. Watering
+    times and schedules come from the catalog, so any catalog change rebuilds it too,
+    which only costs the size of the garden.
+    """
+
+    def __init__(self, catalog, schedules):
+        self.catalog = catalog
+        self.schedules = schedules
+        self._lock = threading.Lock()
+        self._heap = []
+        self._scheduled = {}
+        self._source = {}
+        self._catalog_revision = None
+        self._stale = True
+
+    def rebuild(self, entries):
+        """Start over from garden ``entries`` (a dict by plant id) on the next query"""
+        with self._lock:
+            self._source = entries
+            self._stale = True
+
+    def apply(self, event, entry):
+        """Reschedule the plant touched by one committed garden change"""
+        with self._lock:
+            if self._stale:
+                return
+            now = datetime.now()
+            for slot in WINDOWS:
+                self._schedule(entry, slot, now)
+            # Outdated items only leave the heap when they reach the top, so
+            # start afresh if they ever outnumber the live ones
+            if len(self._heap) > 2 * len(self._scheduled) + 64:
+                self._heap = [(due_at, plant_id, slot) for (plant_id, slot), due_at in self._scheduled.items()]
+                heapq.heapify(self._heap)
+
+    def _due_at(self, entry, slot, now):
+        plant = self.catalog.get(entry['id'])
+        return None if plant is None else next_due(plant, entry, slot, now, self.schedules.get(entry['id']))
+
+    def _build(self, now):
+        self._scheduled.clear()
+        self._heap = []
+        self._catalog_revision = self.catalog.revision
+        for entry in self._source.values():
+            for slot in WINDOWS:
+                due_at = self._due_at(entry, slot, now)
+                if due_at is not None:
+                    self._scheduled[entry['id'], slot] = due_at
+                    self._heap.append((due_at, entry['id'], slot))
+        heapq.heapify(self._heap)
+        self._stale = False
+
+    def _schedule(self, entry, slot, now):
+        key = (entry['id'], slot)
+        due_at = self._due_at(entry, slot, now)
+        if due_at == self._scheduled.get(key):
+            return
+        if due_at is None:
+            del self._scheduled[key]
+        else:
+            self._scheduled[key] = due_at
+            heapq.heappush(self._heap, (due_at, entry['id'], slot))
+
+    def _is_current(self, item):
+        # A plant rescheduled back to an earlier time can leave two equal
+        # items in the heap; due() skips the repeat
+        due_at, plant_id, slot = item
+        return self._scheduled.get((plant_id, slot)) == due_at
+
+    def due(self, now=None):
+        """Reminders whose window is open at ``now``.
+
+        Returns ``([(entry, slot), ...], next_due_at)``: the garden entries
+        that are due, and when the next reminder after them starts (or None).
+        """
+        now = now or datetime.now()
+        self.catalog.refresh()
+        with self._lock:
+            if self._stale or self._catalog_revision != self.catalog.revision:
+                self._build(now)
+            due, open_items = [], set()
+            while self._heap and self._heap[0][0] <= now:
+                item = heapq.heappop(self._heap)
+                if not self._is_current(item) or item in open_items:
+                    continue
+                due_at, plant_id, slot = item
+                if due_at.date() == now.date() and now.time() < WINDOWS[slot][2]:
+                    due.append((self._source[plant_id], slot))
+                    open_items.add(item)
+                else:
+                    # The window closed unwatered; move on to the next one
+                    del self._scheduled[plant_id, slot]
+                    self._schedule(self._source[plant_id], slot, now)
+            while self._heap and not self._is_current(self._heap[0]):
+                heapq.heappop(self._heap)
+            next_due_at = self._heap[0][0] if self._heap else None
+            # Still due until watered or the window closes
+            for item in open_items:
+                heapq.heappush(self._heap, item)
+        return due, next_due_at
@@ -0,0 +1,128 @@
+"""Encoded catalog responses, built once per catalog revision.
+
+Compression uses gzip from the standard library and brotli when the
+``brotli`` package is installed. Each compressed variant is only built
+once a client asks for that encoding.
+"""
+import gzip
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Total size of the bodies kept, every encoding counted; the least
+# recently used responses go first
+MAX_CACHED_BYTES = 64 * 1024 * 1024
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+# Encodings offered, smallest first
+COMPRESSORS = {'gzip': lambda body: gzip.compress(body, GZIP_LEVEL, mtime=0)}
+if brotli is not None:
+    COMPRESSORS = {'br': lambda body: brotli.compress(body, quality=BROTLI_QUALITY), **COMPRESSORS}
+
+
+class CachedResponse:
+    """A response body, compressed for each encoding clients have asked for, with its headers"""
+
+    def __init__(self, etag, body, headers):
+        self.etag = etag
+        self.headers = headers
+        self.bodies = {'identity': body}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        # A copy, since negotiate() may be adding a variant meanwhile
+        return sum(len(body) for body in list(self.bodies.values()))
+
+    def negotiate(self, accept_encodings):
+        """Pick the smallest encoding the client accepts; returns (encoding, body)"""
+        identity = self.bodies['identity']
+        if len(identity) >= MIN_COMPRESS_SIZE:
+            for encoding, compress in COMPRESSORS.items():
+                if accept_encodings[encoding]:
+                    with self._lock:
+                        if encoding not in self.bodies:
+                            self.bodies[encoding] = compress(identity)
+                    return encoding, self.bodies[encoding]
+        return 'identity', identity
+
+
+class ResponseCache:
+    """Encoded responses for the current catalog, keyed by query.
+
+    Entries are tagged with the catalog ETag they were built from, and the
+    first entry for a new ETag drops everything built for older ones. When
+    several requests miss on the same query at once, one builds the
+    response and the others wait for it instead of building it too.
+    Entries are evicted once their bodies add up to over ``max_bytes``;
+    variants compressed after an entry was stored are counted from the
+    next store on.
+    """
+
+    def __init__(self, max_bytes=MAX_CACHED_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # (etag, key) -> Event set once the build in progress finishes
+        self._building = {}
+        self._etag = None
+        self.hits = self.misses = 0
+
+    def get(self, etag, key, build):
+        """The cached response for ``key`` at catalog ``etag``.
+
+        On a miss ``build()`` is called and must return a CachedResponse.
+        It may be for a newer ETag if the catalog moved on meanwhile, in
+        which case that is what gets cached and returned.
+        """
+        waited = False
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                # After waiting, whatever was just built will do
+                if entry is not None and (entry.etag == etag or waited):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                pending = self._building.get((etag, key))
+                building = pending is None
+                if building:
+                    pending = self._building[etag, key] = threading.Event()
+                    self.misses += 1
+            if not building:
+                # Look again once it is built; if the build failed, the
+                # next waiter takes over
+                pending.wait()
+                waited = True
+                continue
+            try:
+                entry = build()
+                self._store(key, entry)
+                return entry
+            finally:
+                with self._lock:
+                    del self._building[etag, key]
+                pending.set()
+
+    def _store(self, key, entry):
+        with self._lock:
+            if entry.etag != self._etag:
+                self._entries.clear()
+                self._etag = entry.etag
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            total = sum(cached.size for cached in self._entries.values())
+            # The newest entry stays even when it is over the cap on its own
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                total -= evicted.size
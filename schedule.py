@@ -0,0 +1,247 @@
+"""Watering schedules compiled from the free-text watering_frequency.
+
+"Once every 2-3 weeks" becomes an interval of 14 to 21 days between
+waterings, "Daily in summer, alternate days in winter" a 1-day interval
+in summer and a 2-day one in winter. Each distinct text is parsed once.
+Text the parser doesn't understand gets no interval and is watered daily,
+as before schedules existed.
+"""
+import bisect
+import re
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+from functools import lru_cache
+
+from plant_store import fix_mojibake
+
+# Months counted as summer (also "hot weather" and "growing season");
+# the rest are winter
+SUMMER_MONTHS = frozenset(range(3, 10))
+
+# Without a winter variant, a summer-only schedule is stretched by this
+# factor the rest of the year
+OFF_SEASON_FACTOR = 2
+
+SEASON_WORDS = {
+    'summer': 'summer', 'hot weather': 'summer', 'growing season': 'summer',
+    'spring': 'summer', 'winter': 'winter', 'monsoon': 'winter', 'rainy season': 'winter',
+}
+TYPOS = {'dialy': 'daily', 'alternative': 'alternate', 'weeky': 'weekly'}
+COUNTS = {'once': 1, 'twice': 2, 'thrice': 3}
+PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30}
+
+NUMBER = r'(\d+|once|twice|thrice)'
+PERIOD = r'(day|week|month)'
+# "once every 2-3 weeks", "every 10 days"
+EVERY_RE = re.compile(rf'(?:once )?every {NUMBER}(?: ?(?:-|to|or) ?{NUMBER})? {PERIOD}s?')
+# "2-3 times weekly", "once or twice a week", "twice monthly"
+TIMES_RE = re.compile(rf'{NUMBER}(?: ?(?:-|to|or) ?{NUMBER})?(?: times)? ?(?:a |per |every )?{PERIOD}(?:ly|s)?\b')
+# "weekly", "every week", "once a month": one watering per period
+PER_PERIOD_RE = re.compile(rf'\b(?:(?:every|each|per|a) {PERIOD}\b|{PERIOD}ly\b)')
+DAILY_RE = re.compile(r'\b(?:daily|every ?day|each day|moist|twice a day)\b')
+ALTERNATE_RE = re.compile(r'\b(?:alternate days?|every other day)\b')
+
+
+def normalize(text):
+    """Lower-case text with mojibake, dashes and common typos fixed"""
+    text = fix_mojibake(text or '').lower()
+    text = re.sub(r'\s*[‒-―-]\s*', '-', text)
+    for typo, word in TYPOS.items():
+        text = re.sub(rf'\b{typo}\b', word, text)
+    return text
+
+
+def count(word):
+    return COUNTS[word] if word in COUNTS else int(word)
+
+
+def parse_interval(clause):
+    """(min_days, max_days) between waterings for one normalized clause, or None
+
+    >>> parse_interval('once every 2-3 weeks'), parse_interval('twice a week')
+    ((14, 21), (4, 4))
+    >>> [parse_interval(text) for text in ('weekly', 'monthly', 'every week', 'water weekly')]
+    [(7, 7), (30, 30), (7, 7), (7, 7)]
+    >>> parse_interval('daily'), parse_interval('when the soil is dry')
+    ((1, 1), None)
+    """
+    match = EVERY_RE.search(clause)
+    if match:
+        low, high, period = match.groups()
+        days = PERIOD_DAYS[period]
+        return count(low) * days, count(high or low) * days
+    match = TIMES_RE.search(clause)
+    if match:
+        low, high, period = match.groups()
+        days = PERIOD_DAYS[period]
+        most, fewest = count(high or low), count(low)
+        if most and fewest:
+            return max(round(days / most), 1), max(round(days / fewest), 1)
+    match = PER_PERIOD_RE.search(clause)
+    if match:
+        days = PERIOD_DAYS[match.group(1) or match.group(2)]
+        return days, days
+    if ALTERNATE_RE.search(clause):
+        return 2, 2
+    if DAILY_RE.search(clause):
+        return 1, 1
+    return None
+
+
+def clause_season(clause):
+    for words, season in SEASON_WORDS.items():
+        if words in clause:
+            return season
+    return None
+
+
+def compile_schedule(text):
+    """Compile watering_frequency text into a schedule dict.
+
+    ``every`` is the (min, max) days between waterings all year, and
+    ``summer``/``winter`` override it for their season; any of them may
+    be None. Anything but a string counts as no text, so one bad record
+    can't stop the indexes from building.
+    """
+    return _compile_schedule(text if isinstance(text, str) else '')
+
+
+@lru_cache(maxsize=4096)
+def _compile_schedule(text):
+    schedule = {"text": normalize(text), "every": None, "summer": None, "winter": None}
+    for clause in re.split(r',|;| and (?=\w+ (?:in|during) )| but ', schedule['text']):
+        interval = parse_interval(clause)
+        if interval is not None:
+            schedule[clause_season(clause) or 'every'] = interval
+    return schedule
+
+
+def season_of(day):
+    return 'summer' if day.month in SUMMER_MONTHS else 'winter'
+
+
+def interval_on(schedule, day):
+    """(min_days, max_days) between waterings in the season of ``day``"""
+    season = season_of(day)
+    if schedule[season]:
+        return schedule[season]
+    if schedule['every']:
+        return schedule['every']
+    other = schedule['winter' if season == 'summer' else 'summer']
+    if other:
+        low, high = other
+        return low * OFF_SEASON_FACTOR, high * OFF_SEASON_FACTOR
+    return 1, 1
+
+
+def next_watering_day(schedule, last_day):
+    """The first day the plant needs water again after ``last_day``; None if never watered"""
+    if last_day is None:
+        return None
+    return last_day + timedelta(days=interval_on(schedule, last_day)[0])
+
+
+class ScheduleIndex:
+    """Compiled schedule for every catalog plant, kept as a PlantStore index.
+
+    Compiling is cached by text, so catalogs with many plants sharing a
+    watering_frequency parse each wording once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._schedules = {}
+
+    def rebuild(self, plants):
+        schedules = {plant_id: compile_schedule(plant.get('watering_frequency') or '')
+                     for plant_id, plant in plants.items()}
+        with self._lock:
+            self._schedules = schedules
+
+    def apply(self, event, plant):
+        if plant is not None:
+            with self._lock:
+                self._schedules[plant['id']] = compile_schedule(plant.get('watering_frequency') or '')
+
+    def get(self, plant_id):
+        """The plant's schedule, or an empty one for unknown plants"""
+        return self._schedules.get(plant_id) or compile_schedule('')
+
+
+def entry_due_day(entry, schedule, today):
+    """The day a saved garden entry next needs water, or None if it isn't saved.
+
+    Plants never watered are due straight away; overdue ones stay on the
+    day they fell due.
+    """
+    if not entry['saved']:
+        return None
+    last = entry.get('last_watered')
+    due = next_watering_day(schedule, date.fromisoformat(last[:10]) if last else None)
+    return today if due is None else due
+
+
+class DueIndex:
+    """Saved plants of one garden bucketed by the day they next need water.
+
+    A Garden index like ReminderIndex: built lazily after a reload and
+    moved between buckets as plants are watered. "What needs water on D"
+    reads the buckets up to D, whose days are kept sorted.
+    """
+
+    def __init__(self, catalog, schedules):
+        self.catalog = catalog
+        self.schedules = schedules
+        self._lock = threading.Lock()
+        self._source = {}
+        self._due = {}
+        self._by_day = defaultdict(set)
+        self._days = []
+        self._catalog_revision = None
+        self._stale = True
+
+    def rebuild(self, entries):
+        with self._lock:
+            self._source = entries
+            self._stale = True
+
+    def apply(self, event, entry):
+        with self._lock:
+            if not self._stale:
+                self._place(entry, date.today())
+
+    def _place(self, entry, today):
+        plant_id = entry['id']
+        old = self._due.pop(plant_id, None)
+        if old is not None:
+            self._by_day[old].discard(plant_id)
+            if not self._by_day[old]:
+                del self._by_day[old]
+                self._days.remove(old)
+        due = None
+        if self.catalog.get(plant_id) is not None:
+            due = entry_due_day(entry, self.schedules.get(plant_id), today)
+        if due is not None:
+            self._due[plant_id] = due
+            if due not in self._by_day:
+                bisect.insort(self._days, due)
+            self._by_day[due].add(plant_id)
+
+    def due_on(self, day):
+        """``[(entry, due_day), ...]`` for saved plants needing water by ``day``, most overdue first"""
+        self.catalog.refresh()
+        with self._lock:
+            if self._stale or self._catalog_revision != self.catalog.revision:
+                self._due.clear()
+                self._by_day.clear()
+                self._days = []
+                today = date.today()
+                for entry in self._source.values():
+                    self._place(entry, today)
+                self._catalog_revision = self.catalog.revision
+                self._stale = False
+            due = []
+            for due_day in self._days[:bisect.bisect_right(self._days, day)]:
+                due.extend((self._source[plant_id], due_day) for plant_id in sorted(self._by_day[due_day]))
+            return due
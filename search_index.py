@@ -0,0 +1,162 @@
+"""In-memory full-text search over the plant catalog"""
+import bisect
+import heapq
+import re
+import threading
+from collections import Counter, defaultdict
+
+# How much a match in each field counts towards a plant's score
+FIELD_WEIGHTS = {'name': 3.0, 'scientific_name': 2.0, 'care_tips': 1.0}
+
+# Match quality multipliers for each way a query term can hit an index term
+EXACT, PREFIX, FUZZY = 1.0, 0.7, 0.5
+
+# Cap on index terms a single query term may expand to, so short prefixes
+# like "a" stay cheap on large catalogs
+MAX_EXPANSIONS = 64
+
+# Minimum trigram similarity for a fuzzy match
+MIN_SIMILARITY = 0.25
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Lower-case alphanumeric words in ``text``; anything but a string has none"""
+    if not isinstance(text, str):
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+def trigrams(term):
+    """Character trigrams of a term padded with word boundaries"""
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Inverted index over name, scientific_name and care_tips.
+
+    Supports exact, prefix and trigram-based fuzzy matching. It follows
+    PlantStore: a reload marks it stale and it is rebuilt on the next
+    search, while individual adds and edits are applied incrementally.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # term -> {plant_id: field-weighted score}
+        self._postings = defaultdict(dict)
+        # plant_id -> terms it was indexed under, so edits can unindex it
+        self._plant_terms = {}
+        # Every term in sorted order, for prefix lookups
+        self._terms = []
+        # trigram -> terms containing it, for fuzzy lookups
+        self._trigrams = defaultdict(set)
+        self._source = {}
+        self._stale = True
+
+    def rebuild(self, plants):
+        """Start over from ``plants`` (a dict by id) on the next search"""
+        with self._lock:
+            self._source = plants
+            self._stale = True
+
+    def apply(self, event, plant):
+        """Keep the index in step with one committed change"""
+        if event['op'] not in ('add', 'edit'):
+            return
+        with self._lock:
+            if self._stale:
+                return
+            self._remove(plant['id'])
+            self._add(plant)
+
+    def _build(self):
+        self._postings.clear()
+        self._plant_terms.clear()
+        self._terms = []
+        self._trigrams.clear()
+        for plant in self._source.values():
+            self._add(plant, keep_sorted=False)
+        self._terms = sorted(self._postings)
+        self._stale = False
+
+    def _add(self, plant, keep_sorted=True):
+        scores = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in set(tokenize(plant.get(field))):
+                scores[term] += weight
+        for term, score in scores.items():
+            postings = self._postings[term]
+            if not postings:
+                if keep_sorted:
+                    bisect.insort(self._terms, term)
+                for gram in trigrams(term):
+                    self._trigrams[gram].add(term)
+            postings[plant['id']] = score
+        self._plant_terms[plant['id']] = set(scores)
+
+    def _remove(self, plant_id):
+        for term in self._plant_terms.pop(plant_id, ()):
+            postings = self._postings[term]
+            postings.pop(plant_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+                for gram in trigrams(term):
+                    self._trigrams[gram].discard(term)
+
+    def _expand(self, query_term):
+        """Index terms matching ``query_term`` with their match quality"""
+        matches = {}
+        if query_term in self._postings:
+            matches[query_term] = EXACT
+        start = bisect.bisect_left(self._terms, query_term)
+        for term in self._terms[start:start + MAX_EXPANSIONS]:
+            if not term.startswith(query_term):
+                break
+            matches.setdefault(term, PREFIX)
+        if matches:
+            return matches
+
+        # Nothing starts with the term, so treat it as a typo
+        query_grams = trigrams(query_term)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._trigrams.get(gram, ()))
+        for term, count in shared.most_common(MAX_EXPANSIONS):
+            similarity = count / (len(query_grams) + len(trigrams(term)) - count)
+            if similarity >= MIN_SIMILARITY:
+                matches[term] = FUZZY * similarity
+        return matches
+
+    def search(self, query, limit=20, offset=0):
+        """Rank plants matching every word of ``query``.
+
+        Returns ``(total, [(plant_id, score), ...])`` for the requested page.
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms:
+            return 0, []
+
+        with self._lock:
+            if self._stale:
+                self._build()
+            scores = None
+            for query_term in query_terms:
+                term_scores = {}
+                for term, quality in self._expand(query_term).items():
+                    for plant_id, weight in self._postings[term].items():
+                        score = quality * weight
+                        if score > term_scores.get(plant_id, 0):
+                            term_scores[plant_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {plant_id: score + term_scores[plant_id]
+                              for plant_id, score in scores.items() if plant_id in term_scores}
+                if not scores:
+                    return 0, []
+
+        ranked = heapq.nsmallest(offset + limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return len(scores), ranked[offset:]
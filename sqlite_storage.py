@@ -0,0 +1,191 @@
+"""SQLite storage backend for the plant catalog"""
+import argparse
+import sqlite3
+import threading
+
+import metrics
+from storage import FileLock, JsonStorage, Storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plants (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    scientific_name TEXT NOT NULL DEFAULT '',
+    image TEXT NOT NULL DEFAULT '',
+    watering_frequency TEXT NOT NULL DEFAULT '',
+    sunlight TEXT NOT NULL DEFAULT '',
+    soil TEXT NOT NULL DEFAULT '',
+    fertilizer TEXT NOT NULL DEFAULT '',
+    growth_type TEXT NOT NULL DEFAULT '',
+    care_tips TEXT NOT NULL DEFAULT '',
+    saved INTEGER NOT NULL DEFAULT 0,
+    last_watered TEXT,
+    watering_day TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS watering_times (
+    plant_id INTEGER NOT NULL REFERENCES plants(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    time_of_day TEXT NOT NULL,
+    PRIMARY KEY (plant_id, position)
+);
+CREATE TABLE IF NOT EXISTS watering_status (
+    plant_id INTEGER NOT NULL REFERENCES plants(id) ON DELETE CASCADE,
+    time_of_day TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (plant_id, time_of_day)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0);
+CREATE INDEX IF NOT EXISTS idx_plants_name ON plants(name);
+CREATE INDEX IF NOT EXISTS idx_plants_saved ON plants(saved);
+CREATE INDEX IF NOT EXISTS idx_plants_sunlight ON plants(sunlight);
+CREATE INDEX IF NOT EXISTS idx_plants_growth_type ON plants(growth_type);
+"""
+
+PLANT_COLUMNS = (
+    'name', 'scientific_name', 'image', 'watering_frequency', 'sunlight',
+    'soil', 'fertilizer', 'growth_type', 'care_tips', 'saved', 'last_watered',
+    'watering_day', 'version'
+)
+
+
+class SqliteStorage(Storage):
+    """Stores plants in a normalized SQLite database.
+
+    Plant ids are the primary key, so single-plant updates touch one row
+    instead of rewriting the whole catalog. The saved, last_watered and
+    watering_day columns and the watering_status table only hold garden
+    state from before gardens moved out of the catalog.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file_lock = FileLock(f"{path}.lock")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA foreign_keys=ON')
+        self._conn.executescript(SCHEMA)
+        self._upgrade_schema()
+
+    def _upgrade_schema(self):
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(plants)')}
+        if 'version' not in columns:
+            with self._conn:
+                self._conn.execute('ALTER TABLE plants ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+        if 'watering_day' not in columns:
+            with self._conn:
+                self._conn.execute('ALTER TABLE plants ADD COLUMN watering_day TEXT')
+
+    def exists(self):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM plants LIMIT 1').fetchone() is not None
+
+    def signature(self):
+        # data_version changes when another connection commits, which is
+        # exactly when our in-memory copy goes stale
+        with self._lock:
+            return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def load(self):
+        with self._lock, metrics.timer('ecobloom_storage_seconds', store='catalog', op='read'):
+            rows = self._conn.execute(
+                f"SELECT id, {', '.join(PLANT_COLUMNS)} FROM plants ORDER BY id"
+            ).fetchall()
+            times = self._conn.execute(
+                'SELECT plant_id, time_of_day FROM watering_times ORDER BY plant_id, position'
+            ).fetchall()
+            statuses = self._conn.execute(
+                'SELECT plant_id, time_of_day, done FROM watering_status'
+            ).fetchall()
+            self.revision = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'revision'"
+            ).fetchone()[0]
+
+        plants = {}
+        with metrics.timer('ecobloom_storage_seconds', store='catalog', op='parse'):
+            for row in rows:
+                plant = {"id": row[0]}
+                plant.update(zip(PLANT_COLUMNS, row[1:]))
+                plant['saved'] = bool(plant['saved'])
+                plant['watering_times'] = []
+                plant['watering_status'] = {"morning": False, "evening": False}
+                plants[plant['id']] = plant
+            for plant_id, time_of_day in times:
+                plants[plant_id]['watering_times'].append(time_of_day)
+            for plant_id, time_of_day, done in statuses:
+                plants[plant_id]['watering_status'][time_of_day] = bool(done)
+        return list(plants.values())
+
+    def _write_plant(self, plant):
+        values = [plant.get(column) for column in PLANT_COLUMNS]
+        values[PLANT_COLUMNS.index('saved')] = int(bool(plant.get('saved')))
+        values[PLANT_COLUMNS.index('version')] = plant.get('version', 1)
+        self._conn.execute(
+            f"INSERT INTO plants (id, {', '.join(PLANT_COLUMNS)}) "
+            f"VALUES (?{', ?' * len(PLANT_COLUMNS)}) "
+            f"ON CONFLICT(id) DO UPDATE SET "
+            f"{', '.join(f'{c} = excluded.{c}' for c in PLANT_COLUMNS)}",
+            [plant['id'], *values]
+        )
+        self._conn.execute('DELETE FROM watering_times WHERE plant_id = ?', (plant['id'],))
+        self._conn.executemany(
+            'INSERT INTO watering_times (plant_id, position, time_of_day) VALUES (?, ?, ?)',
+            [(plant['id'], i, t) for i, t in enumerate(plant.get('watering_times') or [])]
+        )
+        # Garden state from before gardens moved out of the catalog
+        self._conn.execute('DELETE FROM watering_status WHERE plant_id = ?', (plant['id'],))
+        self._conn.executemany(
+            'INSERT INTO watering_status (plant_id, time_of_day, done) VALUES (?, ?, ?)',
+            [(plant['id'], t, int(bool(done))) for t, done in (plant.get('watering_status') or {}).items()]
+        )
+
+    def save_all(self, plants):
+        with self._lock, metrics.timer('ecobloom_storage_seconds', store='catalog', op='write'), self._conn:
+            self._conn.execute('DELETE FROM plants')
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'revision'", (self.revision,))
+            for plant in plants:
+                self._write_plant(plant)
+
+    def record(self, events, plants):
+        with self._lock, metrics.timer('ecobloom_storage_seconds', store='catalog', op='write'), self._conn:
+            for event in events:
+                self._record_event(event, plants)
+            self._conn.execute("UPDATE meta SET value = value + ? WHERE key = 'revision'", (len(events),))
+            self.revision = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'revision'"
+            ).fetchone()[0]
+
+    def _record_event(self, event, plants):
+        if event['op'] == 'add':
+            self._write_plant(event['plant'])
+        else:
+            self._write_plant(plants[event['id']])
+
+    def close(self):
+        self._conn.close()
+
+
+def migrate_json_to_sqlite(json_path, db_path):
+    """One-shot copy of a plants.json catalog into a SQLite database"""
+    plants = JsonStorage(json_path).load()
+    storage = SqliteStorage(db_path)
+    try:
+        storage.save_all(plants)
+    finally:
+        storage.close()
+    return len(plants)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migrate plants.json into SQLite')
+    parser.add_argument('json_path', nargs='?', default='plants.json')
+    parser.add_argument('db_path', nargs='?', default='plants.db')
+    args = parser.parse_args()
+    count = migrate_json_to_sqlite(args.json_path, args.db_path)
+    print(f"Migrated {count} plants into {args.db_path}")
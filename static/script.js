@@ -1,37 +1,385 @@
 // Global variables
+// Catalog pages loaded so far, in id order; the home grid shows these
 let allPlants = [];
+// Every plant this page knows, by id: the loaded pages plus saved plants
+// and search results from pages not loaded yet
+let plantsById = new Map();
 let currentPage = 'home';
 
 // Initialize app
 document.addEventListener('DOMContentLoaded', () => {
     loadPlants();
     checkWateringReminders();
-    // Check reminders every 5 minutes
-    setInterval(checkWateringReminders, 300000);
+    window.addEventListener('scroll', scheduleHomeRender, { passive: true });
+    window.addEventListener('resize', () => {
+        cardHeight = 0;
+        scheduleHomeRender();
+    });
 });
 
-// Load all plants from backend
+// Catalog fields the plant and garden cards need; the details modal fetches the rest
+const CARD_FIELDS = 'id,name,scientific_name,sunlight,version,watering_frequency,watering_times';
+const PAGE_SIZE = 500;
+
+// Catalog saved by the last visit, so returning visits only fetch changes
+const CATALOG_CACHE_KEY = 'ecobloom-catalog';
+
+// Cursor of the next catalog page, or null once the whole catalog is loaded
+let catalogNext = null;
+let catalogRevision = null;
+// Bumped by every reload, so pages still arriving for an older one are dropped
+let catalogLoad = 0;
+
+// Load the first page of plants, or sync the cached copy of all of them;
+// the rest of the pages load as the user scrolls
 async function loadPlants() {
+    const load = ++catalogLoad;
     try {
-        const response = await fetch('/get_plants');
-        allPlants = await response.json();
+        const catalog = await syncCachedCatalog() || await fetchCatalogPage(0);
+        if (load !== catalogLoad) return;
+
+        allPlants = catalog.plants;
+        plantsById = new Map(allPlants.map(plant => [plant.id, plant]));
+        catalogNext = catalog.next ?? null;
+        catalogRevision = catalog.revision;
+        // Search results on pages not loaded yet stay known
+        if (search) {
+            search.results = search.results.map(plant => {
+                if (!plantsById.has(plant.id)) plantsById.set(plant.id, plant);
+                return plantsById.get(plant.id);
+            });
+        }
+        if (catalogNext === null) {
+            saveCachedCatalog(catalog);
+        }
+        await loadGarden();
         displayPlants();
         displayGarden();
+        connectChangeFeed(catalog.revision);
     } catch (error) {
         console.error('Error loading plants:', error);
         showNotification('Error loading plants. Please refresh the page.');
     }
 }
 
-// Display plants on home page
+// One page of plants from the backend, with the cursor of the next
+async function fetchCatalogPage(after) {
+    const response = await fetch(`/get_plants?fields=${CARD_FIELDS}&limit=${PAGE_SIZE}&after=${after}`);
+    return {
+        revision: Number(response.headers.get('X-Catalog-Revision')),
+        plants: await response.json(),
+        next: response.headers.get('X-Next-After')
+    };
+}
+
+// Add the next catalog page to allPlants
+async function loadCatalogPage() {
+    const load = catalogLoad;
+    const page = await fetchCatalogPage(catalogNext);
+    if (load !== catalogLoad) return;
+
+    page.plants.forEach(record => {
+        const plant = plantsById.get(record.id);
+        if (!plant) {
+            setGardenEntry(record, null);
+            plantsById.set(record.id, record);
+            allPlants.push(record);
+            return;
+        }
+        // Saved plants and search results may already be here, and the
+        // change feed may have brought something newer than the page
+        if (record.version >= plant.version) {
+            Object.assign(plant, record);
+        }
+        allPlants.push(plant);
+    });
+    catalogNext = page.next;
+    // The feed follows changes from the first page's revision on
+    if (catalogNext === null) {
+        saveCachedCatalog({ revision: catalogRevision, plants: allPlants });
+    }
+}
+
+// Bring the cached catalog up to date, or return null if it can't be
+async function syncCachedCatalog() {
+    let catalog;
+    try {
+        catalog = JSON.parse(localStorage.getItem(CATALOG_CACHE_KEY));
+    } catch (error) {
+        return null;
+    }
+    if (!catalog) return null;
+
+    // 410 means the server's change history no longer goes back that far
+    const response = await fetch(`/plants/changes?since=${catalog.revision}&fields=${CARD_FIELDS}`);
+    if (!response.ok) return null;
+    const changes = await response.json();
+
+    const byId = new Map(catalog.plants.map(plant => [plant.id, plant]));
+    changes.upserts.forEach(plant => byId.set(plant.id, plant));
+    changes.deletes.forEach(id => byId.delete(id));
+
+    return {
+        revision: changes.revision,
+        plants: [...byId.values()].sort((a, b) => a.id - b.id)
+    };
+}
+
+function saveCachedCatalog(catalog) {
+    // Only the shared catalog is cached; the garden is fetched on every visit
+    const plants = catalog.plants.map(({ saved, watering_status, garden_version, ...plant }) => plant);
+    try {
+        localStorage.setItem(CATALOG_CACHE_KEY, JSON.stringify({ revision: catalog.revision, plants }));
+    } catch (error) {
+        // Over the storage quota; the next visit loads everything again
+        localStorage.removeItem(CATALOG_CACHE_KEY);
+    }
+}
+
+// Load this browser's garden and merge it into the known plants
+async function loadGarden() {
+    const response = await fetch('/garden');
+    await applyGarden(await response.json());
+}
+
+// Mark each plant with its garden entry; plants not in the garden have none
+async function applyGarden(garden) {
+    const entries = new Map(garden.plants.map(entry => [entry.id, entry]));
+    plantsById.forEach(plant => setGardenEntry(plant, entries.get(plant.id)));
+
+    // The garden page needs the cards of saved plants on pages not loaded yet
+    if (garden.plants.every(entry => plantsById.has(entry.id))) return;
+    (await fetchSavedPlants()).forEach(plant => {
+        if (plantsById.has(plant.id)) return;
+        setGardenEntry(plant, entries.get(plant.id));
+        plantsById.set(plant.id, plant);
+    });
+}
+
+// Card fields of every plant in this browser's garden
+async function fetchSavedPlants() {
+    const plants = [];
+    let after = 0;
+    while (after !== null) {
+        const response = await fetch(`/plants/filter?saved=true&fields=${CARD_FIELDS}&limit=${PAGE_SIZE}&after=${after}`);
+        plants.push(...(await response.json()).plants);
+        after = response.headers.get('X-Next-After');
+    }
+    return plants;
+}
+
+function setGardenEntry(plant, entry) {
+    plant.saved = !!entry;
+    plant.watering_status = entry ? { ...entry.watering_status } : { morning: false, evening: false };
+    // /garden leaves out plants removed from it, whose versions live on
+    // server-side, so only entries it returned are sent with If-Match
+    plant.garden_version = entry ? entry.version : undefined;
+}
+
+function gardenHeaders(plant, headers = {}) {
+    if (plant.garden_version !== undefined) {
+        headers['If-Match'] = `"${plant.garden_version}"`;
+    }
+    return headers;
+}
+
+// A plant new to the catalog; while pages are still to load it comes with
+// the last of them instead
+function addPlant(plant) {
+    if (catalogNext !== null || plantsById.has(plant.id)) return;
+    setGardenEntry(plant, null);
+    plantsById.set(plant.id, plant);
+    allPlants.push(plant);
+}
+
+// Live changes from other sessions, patched into the known plants
+let changeFeed = null;
+let renderPending = false;
+
+function connectChangeFeed(revision) {
+    // An open feed resumes by itself (Last-Event-ID) after reconnecting
+    if (changeFeed || !window.EventSource) return;
+
+    changeFeed = new EventSource(`/events?since=${revision}`);
+    changeFeed.onmessage = event => applyChange(JSON.parse(event.data));
+    // Too far behind to catch up change by change
+    changeFeed.addEventListener('reload', () => loadPlants());
+    // This browser's garden changed, or a new day cleared its waterings
+    changeFeed.addEventListener('garden', async event => {
+        await applyGarden(JSON.parse(event.data));
+        scheduleRender();
+    });
+}
+
+function applyChange(change) {
+    const plant = plantsById.get(change.plant.id);
+
+    if (!plant) {
+        addPlant(change.plant);
+    } else if (change.plant.version >= plant.version) {
+        // Older records can arrive after a reload that already has newer data
+        Object.assign(plant, change.plant);
+    } else {
+        return;
+    }
+    scheduleRender();
+}
+
+// Redraw once for a burst of changes; only cards whose plant changed are rebuilt
+function scheduleRender() {
+    if (renderPending) return;
+    renderPending = true;
+    requestAnimationFrame(() => {
+        renderPending = false;
+        displayPlants();
+        displayGarden();
+    });
+}
+
+// Redraw the home grid once per frame while scrolling
+let homeRenderPending = false;
+
+function scheduleHomeRender() {
+    if (homeRenderPending) return;
+    homeRenderPending = true;
+    requestAnimationFrame(() => {
+        homeRenderPending = false;
+        displayPlants();
+    });
+}
+
+// The home grid only holds the cards of the rows on screen, plus this many
+// above and below; padding stands in for the rest
+const OVERSCAN_ROWS = 3;
+// Start fetching the next page this many rows before the loaded ones run out
+const LOAD_AHEAD_ROWS = 10;
+// Home cards kept for plants scrolled out of view before they are dropped
+const CARD_CACHE_SIZE = 1000;
+
+// Height of a home card, measured from the first one drawn; the card
+// styles keep every card the same height
+let cardHeight = 0;
+
+// Cards by plant id, with what they were drawn from
+const plantCards = new Map();
+const gardenCards = new Map();
+
+// The card for a plant, rebuilt only if it would now show something else
+function keyedCard(cards, plant, signature, create) {
+    const cached = cards.get(plant.id);
+    if (cached && cached.plant === plant && cached.signature === signature) {
+        return cached.element;
+    }
+    const element = create(plant);
+    cards.set(plant.id, { plant, signature, element });
+    return element;
+}
+
+function homeCard(plant) {
+    return keyedCard(plantCards, plant, `${plant.version}:${plant.saved}`, createPlantCard);
+}
+
+// Make parent's children exactly ``nodes``, moving ones already there
+// instead of recreating them
+function patchChildren(parent, nodes) {
+    const wanted = new Set(nodes);
+    let current = parent.firstChild;
+    const skipUnwanted = () => {
+        while (current && !wanted.has(current)) {
+            const next = current.nextSibling;
+            parent.removeChild(current);
+            current = next;
+        }
+    };
+    nodes.forEach(node => {
+        skipUnwanted();
+        if (node === current) {
+            current = current.nextSibling;
+        } else {
+            parent.insertBefore(node, current);
+        }
+    });
+    skipUnwanted();
+}
+
+// Display plants on home page: the catalog, or the current search's results
 function displayPlants() {
     const grid = document.getElementById('plants-grid');
-    grid.innerHTML = '';
+    // Not laid out while the home page is hidden; showPage draws it again
+    if (!grid.offsetParent) return;
+
+    const plants = search ? search.results : allPlants;
+    if (plants.length === 0) {
+        grid.style.paddingTop = grid.style.paddingBottom = '';
+        patchChildren(grid, []);
+        loadMore();
+        return;
+    }
 
-    allPlants.forEach(plant => {
-        const card = createPlantCard(plant);
-        grid.appendChild(card);
-    });
+    const style = getComputedStyle(grid);
+    const columns = style.gridTemplateColumns.split(' ').length;
+    const gap = parseFloat(style.rowGap) || 0;
+    if (!cardHeight) {
+        patchChildren(grid, [homeCard(plants[0])]);
+        cardHeight = grid.firstChild.offsetHeight;
+    }
+
+    // Rows overlapping the viewport, from where the grid's top is on screen
+    const stride = cardHeight + gap;
+    const rows = Math.ceil(plants.length / columns);
+    const top = grid.getBoundingClientRect().top;
+    const first = Math.min(Math.max(Math.floor(-top / stride) - OVERSCAN_ROWS, 0), rows);
+    const last = Math.min(Math.max(Math.ceil((window.innerHeight - top) / stride) + OVERSCAN_ROWS, first), rows);
+
+    const height = rows * stride - gap;
+    const shownHeight = last > first ? (last - first) * stride - gap : 0;
+    const paddingTop = Math.min(first * stride, height);
+    grid.style.paddingTop = `${paddingTop}px`;
+    grid.style.paddingBottom = `${Math.max(height - paddingTop - shownHeight, 0)}px`;
+
+    const shown = plants.slice(first * columns, last * columns);
+    patchChildren(grid, shown.map(homeCard));
+
+    if (plantCards.size > CARD_CACHE_SIZE) {
+        const shownIds = new Set(shown.map(plant => plant.id));
+        plantCards.forEach((card, id) => {
+            if (!shownIds.has(id)) plantCards.delete(id);
+        });
+    }
+    if (last >= rows - LOAD_AHEAD_ROWS) {
+        loadMore();
+    }
+}
+
+// Fetch the next page of whatever the home grid shows, if there is one
+let loadingMore = false;
+
+async function loadMore() {
+    const more = search ? !search.done : catalogNext !== null;
+    if (loadingMore || !more) return;
+
+    loadingMore = true;
+    try {
+        if (search) {
+            await loadSearchPage(search);
+        } else {
+            await loadCatalogPage();
+        }
+    } catch (error) {
+        console.error('Error loading more plants:', error);
+        showNotification('Error loading more plants. Please try again.');
+        return;
+    } finally {
+        loadingMore = false;
+    }
+    // Draws the new rows, and asks for another page if the screen isn't full yet
+    scheduleHomeRender();
+}
+
+// Plant images come resized from the server's image cache; the version
+// makes an edited plant's image a new URL
+function imageUrl(plant, size) {
+    return `/img/${plant.id}?size=${size}&v=${plant.version}`;
 }
 
 // Create plant card element
@@ -42,10 +390,10 @@ function createPlantCard(plant) {
 
     card.innerHTML = `
         ${plant.saved ? '<div class="saved-badge">✓</div>' : ''}
-        <img src="${plant.image || 'https://via.placeholder.com/400x300?text=' + encodeURIComponent(plant.name)}" 
+        <img src="${imageUrl(plant, 400)}" 
              alt="${plant.name}" 
              class="plant-card-image"
-             onerror="this.src='https://via.placeholder.com/400x300?text=${encodeURIComponent(plant.name)}'">
+             loading="lazy">
         <div class="plant-card-body">
             <h3 class="plant-card-name">${plant.name}</h3>
             <p class="plant-card-scientific">${plant.scientific_name}</p>
@@ -57,17 +405,28 @@ function createPlantCard(plant) {
 }
 
 // Show plant details in modal
-function showPlantDetails(plant) {
+async function showPlantDetails(plant) {
+    // Cards only carry CARD_FIELDS, so fetch the full record on first open
+    if (!('care_tips' in plant)) {
+        try {
+            const response = await fetch(`/plants/${plant.id}`);
+            Object.assign(plant, await response.json());
+        } catch (error) {
+            console.error('Error loading plant details:', error);
+            showNotification('Error loading plant details. Please try again.');
+            return;
+        }
+    }
+
     const modal = document.getElementById('plant-modal');
     const modalBody = document.getElementById('modal-body');
 
     const wateringTimes = plant.watering_times.join(' & ');
 
     modalBody.innerHTML = `
-        <img src="${plant.image || 'https://via.placeholder.com/600x300?text=' + encodeURIComponent(plant.name)}" 
+        <img src="${imageUrl(plant, 600)}" 
              alt="${plant.name}" 
-             class="modal-plant-image"
-             onerror="this.src='https://via.placeholder.com/600x300?text=${encodeURIComponent(plant.name)}'">
+             class="modal-plant-image">
         <h2 class="modal-plant-name">${plant.name}</h2>
         <p class="modal-scientific-name">${plant.scientific_name}</p>
 
@@ -121,14 +480,23 @@ function closeModal() {
 
 // Toggle save to garden
 async function toggleSaveToGarden(plantId) {
-    const plant = allPlants.find(p => p.id === plantId);
+    const plant = plantsById.get(plantId);
 
     try {
         const endpoint = plant.saved ? `/remove_from_garden/${plantId}` : `/save_to_garden/${plantId}`;
-        const response = await fetch(endpoint, { method: 'POST' });
+        const response = await fetch(endpoint, {
+            method: 'POST',
+            headers: gardenHeaders(plant)
+        });
         const data = await response.json();
 
+        if (response.status === 412) {
+            handleVersionConflict(data);
+            return;
+        }
+
         if (data.success) {
+            plant.garden_version = data.version;
             plant.saved = !plant.saved;
             if (!plant.saved) {
                 plant.watering_status = { morning: false, evening: false };
@@ -154,22 +522,30 @@ function displayGarden() {
     const grid = document.getElementById('garden-grid');
     const noPlants = document.getElementById('no-plants-message');
 
-    const savedPlants = allPlants.filter(p => p.saved);
+    const savedPlants = [...plantsById.values()].filter(p => p.saved).sort((a, b) => a.id - b.id);
+
+    // Forget the cards of plants no longer in the garden
+    const savedIds = new Set(savedPlants.map(plant => plant.id));
+    gardenCards.forEach((card, id) => {
+        if (!savedIds.has(id)) gardenCards.delete(id);
+    });
 
     if (savedPlants.length === 0) {
         grid.style.display = 'none';
         noPlants.style.display = 'block';
+        patchChildren(grid, []);
         return;
     }
 
     grid.style.display = 'grid';
     noPlants.style.display = 'none';
-    grid.innerHTML = '';
 
-    savedPlants.forEach(plant => {
-        const card = createGardenCard(plant);
-        grid.appendChild(card);
-    });
+    patchChildren(grid, savedPlants.map(gardenCard));
+}
+
+function gardenCard(plant) {
+    const status = plant.watering_status;
+    return keyedCard(gardenCards, plant, `${plant.version}:${status.morning}:${status.evening}`, createGardenCard);
 }
 
 // Create garden card with watering buttons
@@ -182,10 +558,10 @@ function createGardenCard(plant) {
 
     card.innerHTML = `
         <div class="garden-card-header">
-            <img src="${plant.image || 'https://via.placeholder.com/80?text=' + encodeURIComponent(plant.name)}" 
+            <img src="${imageUrl(plant, 160)}" 
                  alt="${plant.name}" 
                  class="garden-card-image"
-                 onerror="this.src='https://via.placeholder.com/80?text=${encodeURIComponent(plant.name)}'">
+                 loading="lazy">
             <div class="garden-card-info">
                 <h3>${plant.name}</h3>
                 <p>${plant.watering_frequency}</p>
@@ -222,17 +598,24 @@ function createGardenCard(plant) {
 
 // Mark watering as done
 async function markWatering(plantId, timeOfDay) {
+    const plant = plantsById.get(plantId);
+
     try {
         const response = await fetch(`/update_watering/${plantId}`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: gardenHeaders(plant, { 'Content-Type': 'application/json' }),
             body: JSON.stringify({ time_of_day: timeOfDay })
         });
 
         const data = await response.json();
 
+        if (response.status === 412) {
+            handleVersionConflict(data);
+            return;
+        }
+
         if (data.success) {
-            const plant = allPlants.find(p => p.id === plantId);
+            plant.garden_version = data.version;
             plant.watering_status[timeOfDay] = true;
             displayGarden();
             showNotification(`✅ ${timeOfDay.charAt(0).toUpperCase() + timeOfDay.slice(1)} watering completed for ${plant.name}!`);
@@ -243,57 +626,177 @@ async function markWatering(plantId, timeOfDay) {
     }
 }
 
-// Check and show watering reminders
-function checkWateringReminders() {
-    const savedPlants = allPlants.filter(p => p.saved);
-    const currentHour = new Date().getHours();
+// Water every plant the server says is due with a single batch request
+async function waterAllDue() {
+    try {
+        const response = await fetch('/reminders/due');
+        const operations = dueOperations(await response.json());
 
-    savedPlants.forEach(plant => {
-        // Morning reminder (6 AM - 10 AM)
-        if (currentHour >= 6 && currentHour < 10 &&
-            plant.watering_times.includes('Morning') &&
-            !plant.watering_status.morning) {
-            setTimeout(() => {
-                showWateringAlert(plant, 'morning');
-            }, Math.random() * 5000); // Random delay to avoid all at once
+        if (operations.length === 0) {
+            showNotification('Nothing is due for watering right now.');
+            return;
         }
 
-        // Evening reminder (5 PM - 8 PM)
-        if (currentHour >= 17 && currentHour < 20 &&
-            plant.watering_times.includes('Evening') &&
-            !plant.watering_status.evening) {
-            setTimeout(() => {
-                showWateringAlert(plant, 'evening');
-            }, Math.random() * 5000);
-        }
+        await waterBatch(operations);
+    } catch (error) {
+        console.error('Error checking reminders:', error);
+        showNotification('Error updating watering status. Please try again.');
+    }
+}
+
+// /batch water operations for every plant in a /reminders/due digest
+function dueOperations(digest) {
+    const operations = [];
+    ['morning', 'evening'].forEach(timeOfDay => {
+        digest.due[timeOfDay].forEach(plant => {
+            operations.push({ op: 'water', id: plant.id, time_of_day: timeOfDay, if_match: plant.version });
+        });
     });
+    return operations;
 }
 
-// Show watering alert
-function showWateringAlert(plant, timeOfDay) {
-    const message = `🌱 Don't forget to water your ${plant.name} this ${timeOfDay}!`;
+// Record several waterings with one /batch request
+async function waterBatch(operations) {
+    try {
+        const response = await fetch('/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ operations })
+        });
 
-    if (confirm(message + '\n\nMark as watered now?')) {
-        markWatering(plant.id, timeOfDay);
+        const data = await response.json();
+
+        let watered = 0;
+        data.results.forEach((result, i) => {
+            if (!result.success) return;
+            const plant = plantsById.get(operations[i].id);
+            if (!plant) return;
+            plant.garden_version = result.version;
+            plant.watering_status[operations[i].time_of_day] = true;
+            watered++;
+        });
+
+        displayGarden();
+        showNotification(`✅ Recorded ${watered} watering${watered === 1 ? '' : 's'}!`);
+    } catch (error) {
+        console.error('Error watering plants:', error);
+        showNotification('Error updating watering status. Please try again.');
+    }
+}
+
+// Another session changed the plant first; reload and let the user retry
+function handleVersionConflict(data) {
+    showNotification(data.message);
+    loadPlants();
+}
+
+// Re-check at least this often so waterings from other tabs are noticed
+const REMINDER_POLL_MS = 300000;
+let reminderTimer = null;
+
+// Ask the server what is due and check again when the next reminder starts
+async function checkWateringReminders() {
+    clearTimeout(reminderTimer);
+    let nextCheck = REMINDER_POLL_MS;
+
+    try {
+        const response = await fetch('/reminders/due');
+        const digest = await response.json();
+
+        if (digest.next_due) {
+            const untilNext = new Date(digest.next_due) - new Date();
+            nextCheck = Math.min(nextCheck, Math.max(untilNext, 1000));
+        }
+        if (digest.total > 0) {
+            showWateringAlert(digest);
+        }
+    } catch (error) {
+        console.error('Error checking reminders:', error);
+    }
+
+    reminderTimer = setTimeout(checkWateringReminders, nextCheck);
+}
+
+// Show one alert listing every due plant
+async function showWateringAlert(digest) {
+    const lines = [];
+
+    ['morning', 'evening'].forEach(timeOfDay => {
+        const plants = digest.due[timeOfDay];
+        if (plants.length === 0) return;
+        lines.push(`This ${timeOfDay}: ${plants.map(p => p.name).join(', ')}`);
+    });
+
+    const message = `🌱 Don't forget to water your plants!\n\n${lines.join('\n')}`;
+
+    if (confirm(message + '\n\nMark them all as watered now?')) {
+        await waterBatch(dueOperations(digest));
     }
 }
 
-// Filter plants by search
+// Filter plants by search, ranked on the server. Runs once typing pauses;
+// further pages of results load as the user scrolls
+const SEARCH_DEBOUNCE_MS = 250;
+// The most /search returns at once
+const SEARCH_PAGE_SIZE = 100;
+
+// The search the home grid shows, or null for the catalog
+let search = null;
+let searchSeq = 0;
+let searchTimer = null;
+
 function filterPlants() {
-    const searchTerm = document.getElementById('search-input').value.toLowerCase();
-    const grid = document.getElementById('plants-grid');
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(runSearch, SEARCH_DEBOUNCE_MS);
+}
 
-    grid.innerHTML = '';
+async function runSearch() {
+    const query = document.getElementById('search-input').value.trim();
+    // Also drops a search still in flight for text since erased
+    const seq = ++searchSeq;
+    if (query === (search ? search.query : '')) return;
+
+    let next = null;
+    if (query) {
+        try {
+            next = { query, results: [], done: false };
+            await loadSearchPage(next);
+        } catch (error) {
+            console.error('Error searching plants:', error);
+            return;
+        }
+        // A later search already started
+        if (seq !== searchSeq) return;
+    }
 
-    const filtered = allPlants.filter(plant =>
-        plant.name.toLowerCase().includes(searchTerm) ||
-        plant.scientific_name.toLowerCase().includes(searchTerm)
-    );
+    search = next;
+    // Show the new list from its start
+    const grid = document.getElementById('plants-grid');
+    if (grid.getBoundingClientRect().top < 0) {
+        document.querySelector('.search-section').scrollIntoView();
+    }
+    displayPlants();
+}
 
-    filtered.forEach(plant => {
-        const card = createPlantCard(plant);
-        grid.appendChild(card);
+// Add the next page of ranked results to ``target``
+async function loadSearchPage(target) {
+    const params = new URLSearchParams({
+        q: target.query, fields: CARD_FIELDS, limit: SEARCH_PAGE_SIZE, offset: target.results.length
+    });
+    const response = await fetch(`/search?${params}`);
+    const data = await response.json();
+
+    data.results.forEach(({ score, ...record }) => {
+        let plant = plantsById.get(record.id);
+        if (!plant) {
+            // From a catalog page not loaded yet; saved plants are all known
+            plant = record;
+            setGardenEntry(plant, null);
+            plantsById.set(plant.id, plant);
+        }
+        target.results.push(plant);
     });
+    target.done = data.results.length < SEARCH_PAGE_SIZE || target.results.length >= data.total;
 }
 
 // Show page
@@ -311,6 +814,9 @@ function showPage(pageName) {
     event.target.closest('.nav-btn').classList.add('active');
 
     currentPage = pageName;
+    if (pageName === 'home') {
+        displayPlants();
+    }
 }
 
 // Handle photo upload
@@ -323,7 +829,7 @@ function handlePhotoUpload(event) {
     const plantName = prompt('Could not automatically identify plant. Please enter the plant name:');
 
     if (plantName) {
-        const existingPlant = allPlants.find(p =>
+        const existingPlant = [...plantsById.values()].find(p =>
             p.name.toLowerCase() === plantName.toLowerCase()
         );
 
@@ -374,8 +880,7 @@ async function submitNewPlant(event) {
         soil: document.getElementById('new-soil').value,
         fertilizer: document.getElementById('new-fertilizer').value,
         growth_type: document.getElementById('new-growth-type').value,
-        care_tips: document.getElementById('new-care-tips').value,
-        saved: false
+        care_tips: document.getElementById('new-care-tips').value
     };
 
     try {
@@ -388,7 +893,7 @@ async function submitNewPlant(event) {
         const data = await response.json();
 
         if (data.success) {
-            allPlants.push(data.plant);
+            addPlant(data.plant);
             displayPlants();
             closeAddPlantModal();
             showNotification('✅ Plant added successfully!');
@@ -0,0 +1,152 @@
+"""Storage backends for the plant catalog"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the single-process dev server runs there
+    fcntl = None
+
+
+def write_atomic(path, data):
+    """Write ``data`` to ``path`` via a temp file and rename.
+
+    Readers see either the old contents or the new ones, never a
+    half-written file, and a crash mid-write leaves the old file intact.
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class FileLock:
+    """Cross-process lock on a lock file, built on flock(2).
+
+    Shared holds are for loading, exclusive holds for read-modify-write.
+    Callers are already serialized within the process (PlantStore holds
+    its own lock around every use), so nested holds just bump a counter.
+    The file is opened per hold so the lock is never inherited across a
+    fork by gunicorn workers.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+
+    @contextmanager
+    def hold(self, shared=False, blocking=True):
+        """Hold the lock; yields False if ``blocking`` is off and it is taken"""
+        if self._depth == 0 and fcntl is not None:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            if not blocking:
+                flags |= fcntl.LOCK_NB
+            try:
+                fcntl.flock(fd, flags)
+            except BlockingIOError:
+                os.close(fd)
+                yield False
+                return
+            self._fd = fd
+        self._depth += 1
+        try:
+            yield True
+        finally:
+            self._depth -= 1
+            if self._depth == 0 and self._fd is not None:
+                # Closing the descriptor releases the flock
+                os.close(self._fd)
+                self._fd = None
+
+
+class Storage:
+    """Interface every storage backend implements.
+
+    Backends only have to load and save the full catalog; ``record``
+    defaults to a full save and can be overridden by backends that can
+    persist a single change more cheaply. ``revision`` counts committed
+    changes and is stored alongside the data, so every worker agrees on it.
+    """
+
+    revision = 0
+
+    def exists(self):
+        """Return True once the catalog has been created"""
+        raise NotImplementedError
+
+    def signature(self):
+        """Return a value that changes whenever the stored data changes"""
+        raise NotImplementedError
+
+    def load(self):
+        """Return every plant as a list of dicts and update ``revision``"""
+        raise NotImplementedError
+
+    def save_all(self, plants):
+        """Replace the stored catalog with ``plants``"""
+        raise NotImplementedError
+
+    def record(self, events, plants):
+        """Persist change events in one write; ``plants`` is the updated catalog by id.
+
+        Each event counts as one revision.
+        """
+        self.revision += len(events)
+        self.save_all(plants.values())
+
+
+class JsonStorage(Storage):
+    """Keeps the whole catalog in one JSON file.
+
+    The file holds ``{"revision": n, "plants": [...]}``; a bare list (the
+    original format) is read as revision 0. ``kind`` labels its storage
+    metrics: "catalog", or "garden" for users' gardens.
+    """
+
+    def __init__(self, path, kind='catalog'):
+        self.path = path
+        self.kind = kind
+        self.file_lock = FileLock(f"{path}.lock")
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # Every save is a rename onto a new inode, so the inode catches
+        # writes that land within the filesystem's mtime granularity
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def load(self):
+        if not self.exists():
+            self.revision = 0
+            return []
+        with metrics.timer('ecobloom_storage_seconds', store=self.kind, op='read'):
+            with open(self.path, 'rb') as f:
+                text = f.read()
+        metrics.inc('ecobloom_storage_bytes_total', len(text), store=self.kind, op='read')
+        with metrics.timer('ecobloom_storage_seconds', store=self.kind, op='parse'):
+            data = json.loads(text)
+        if isinstance(data, list):
+            self.revision = 0
+            return data
+        self.revision = data['revision']
+        return data['plants']
+
+    def save_all(self, plants):
+        with metrics.timer('ecobloom_storage_seconds', store=self.kind, op='serialize'):
+            data = json.dumps({"revision": self.revision, "plants": list(plants)}, indent=2)
+        with metrics.timer('ecobloom_storage_seconds', store=self.kind, op='write'):
+            write_atomic(self.path, data)
+        metrics.inc('ecobloom_storage_bytes_total', len(data), store=self.kind, op='write')
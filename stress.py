@@ -0,0 +1,146 @@
+"""Stress test: hammer /update_watering from many processes and check no update is lost.
+
+Every process waters plants in the same (default) garden. Run against a
+live server with --url, or let the script start a multi-worker gunicorn
+on a scratch copy of plants.json:
+
+    python stress.py --workers 4 --processes 8 --requests 200
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def get_catalog(url):
+    """Return (revision, plants) from /get_plants"""
+    with urllib.request.urlopen(f"{url}/get_plants") as response:
+        return int(response.headers['X-Catalog-Revision']), json.load(response)
+
+
+def get_garden(url):
+    """Return (revision, saved plants) from /garden"""
+    with urllib.request.urlopen(f"{url}/garden") as response:
+        garden = json.load(response)
+    return garden['revision'], garden['plants']
+
+
+def water_plants(args):
+    """Send ``count`` waterings for random plants; return the ones acknowledged"""
+    url, plant_ids, count, seed = args
+    rng = random.Random(seed)
+    acknowledged = []
+    for _ in range(count):
+        plant_id = rng.choice(plant_ids)
+        time_of_day = rng.choice(['morning', 'evening'])
+        request = urllib.request.Request(
+            f"{url}/update_watering/{plant_id}",
+            data=json.dumps({"time_of_day": time_of_day}).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        with urllib.request.urlopen(request) as response:
+            if json.load(response).get('success'):
+                acknowledged.append((plant_id, time_of_day))
+    return acknowledged
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, backend):
+    """Start gunicorn on a scratch copy of the catalog; return (process, url, dir)"""
+    data_dir = tempfile.mkdtemp(prefix='ecobloom-stress-')
+    shutil.copy(os.path.join(APP_DIR, 'plants.json'), data_dir)
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=APP_DIR, ECOBLOOM_STORAGE=backend, ECOBLOOM_RATE_LIMIT='0')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f"127.0.0.1:{port}", 'EcoBloom:app'],
+        cwd=data_dir, env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            get_catalog(url)
+            return server, url, data_dir
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def save_all(url, plant_ids):
+    """Save every plant to the garden, so /garden lists their statuses"""
+    request = urllib.request.Request(
+        f"{url}/batch",
+        data=json.dumps({"operations": [{"op": "save", "id": plant_id} for plant_id in plant_ids]}).encode(),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    urllib.request.urlopen(request).close()
+
+
+def run(url, processes, requests_per_process):
+    _, plants = get_catalog(url)
+    plant_ids = [plant['id'] for plant in plants]
+    save_all(url, plant_ids)
+    start_revision, _ = get_garden(url)
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        jobs = [(url, plant_ids, requests_per_process, seed) for seed in range(processes)]
+        results = pool.map(water_plants, jobs)
+    elapsed = time.perf_counter() - started
+
+    acknowledged = [item for result in results for item in result]
+    end_revision, entries = get_garden(url)
+    by_id = {entry['id']: entry for entry in entries}
+    missing = {(plant_id, time_of_day) for plant_id, time_of_day in acknowledged
+               if not by_id[plant_id]['watering_status'].get(time_of_day)}
+    lost = len(acknowledged) - (end_revision - start_revision)
+
+    print(f"{len(acknowledged)} waterings in {elapsed:.2f}s "
+          f"({len(acknowledged) / elapsed:.0f} req/s) from {processes} processes")
+    print(f"revision {start_revision} -> {end_revision}, lost updates: {lost}, "
+          f"missing statuses: {len(missing)}")
+    return lost == 0 and not missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='server to test; omit to start gunicorn')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers to start')
+    parser.add_argument('--backend', default='json', choices=['json', 'sqlite', 'log'])
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='requests per process')
+    args = parser.parse_args()
+
+    server = data_dir = None
+    url = args.url
+    if url is None:
+        server, url, data_dir = start_server(args.workers, args.backend)
+    try:
+        ok = run(url.rstrip('/'), args.processes, args.requests)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(data_dir, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""Tests for group_commit and how the stores use it"""
+import json
+import threading
+
+import pytest
+
+from garden_store import Garden
+from group_commit import GroupCommit, Unwritten
+from plant_store import PlantStore
+from storage import JsonStorage
+
+# Long enough for every writer in a test to join the leader's commit
+WINDOW = 0.2
+
+
+def submit_together(commits, batches):
+    """Submit each batch from its own thread; returns each one's results or error"""
+    outcomes = [None] * len(batches)
+
+    def submit(i):
+        try:
+            outcomes[i] = commits.submit(batches[i])
+        except BaseException as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(batches))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+class Recorder:
+    """apply_batch stand-in that logs each call and fails on request"""
+
+    def __init__(self, fail=None):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, operations):
+        self.calls.append(list(operations))
+        if self.fail is not None:
+            error = self.fail(operations)
+            if error is not None:
+                raise error
+        return [operation * 10 for operation in operations]
+
+
+def test_concurrent_writers_share_a_commit():
+    apply_batch = Recorder()
+    commits = GroupCommit(apply_batch, 'test', WINDOW)
+    outcomes = submit_together(commits, [[1, 2], [3], [4, 5, 6]])
+    assert len(apply_batch.calls) == 1
+    assert sorted(apply_batch.calls[0]) == [1, 2, 3, 4, 5, 6]
+    assert outcomes == [[10, 20], [30], [40, 50, 60]]
+
+
+def test_lone_writer_goes_straight_through():
+    apply_batch = Recorder()
+    commits = GroupCommit(apply_batch, 'test', 0)
+    assert commits.submit([7]) == [70]
+    assert apply_batch.calls == [[7]]
+
+
+def test_max_operations_splits_commits():
+    apply_batch = Recorder()
+    commits = GroupCommit(apply_batch, 'test', WINDOW, max_operations=2)
+    outcomes = submit_together(commits, [[1], [2], [3]])
+    assert outcomes == [[10], [20], [30]]
+    assert all(len(call) <= 2 for call in apply_batch.calls)
+    assert len(apply_batch.calls) == 2
+
+
+def test_unwritten_failure_is_retried_one_writer_at_a_time():
+    def fail(operations):
+        if 0 in operations:
+            return Unwritten(ValueError("bad operation"))
+
+    apply_batch = Recorder(fail)
+    commits = GroupCommit(apply_batch, 'test', WINDOW)
+    outcomes = submit_together(commits, [[1], [0], [2]])
+    assert outcomes[0] == [10]
+    assert outcomes[2] == [20]
+    # The writer sees the original error, not the wrapper
+    assert type(outcomes[1]) is ValueError
+    # One group attempt, then each writer alone
+    assert len(apply_batch.calls) == 4
+
+
+def test_failure_after_the_write_is_not_retried():
+    apply_batch = Recorder(lambda operations: OSError("fsync failed"))
+    commits = GroupCommit(apply_batch, 'test', WINDOW)
+    outcomes = submit_together(commits, [[1], [2]])
+    assert len(apply_batch.calls) == 1
+    assert all(isinstance(outcome, OSError) for outcome in outcomes)
+
+
+def test_base_exception_reaches_every_writer():
+    apply_batch = Recorder(lambda operations: KeyboardInterrupt())
+    commits = GroupCommit(apply_batch, 'test', WINDOW)
+    outcomes = submit_together(commits, [[1], [2]])
+    assert len(apply_batch.calls) == 1
+    assert all(isinstance(outcome, KeyboardInterrupt) for outcome in outcomes)
+
+
+def test_commits_continue_after_a_failure():
+    apply_batch = Recorder(lambda operations: OSError("disk full") if 0 in operations else None)
+    commits = GroupCommit(apply_batch, 'test', 0)
+    with pytest.raises(OSError):
+        commits.submit([0])
+    assert commits.submit([1]) == [10]
+
+
+class FailingIndex:
+    """Index that can't take plants named "bad" incrementally"""
+
+    def __init__(self):
+        self.rebuilds = 0
+        self.names = set()
+
+    def rebuild(self, plants):
+        self.rebuilds += 1
+        self.names = {plant['name'] for plant in plants.values()}
+
+    def apply(self, event, plant):
+        if plant['name'] == 'bad':
+            raise RuntimeError("index failed")
+        self.names.add(plant['name'])
+
+
+def stored_names(path):
+    with open(path) as f:
+        return [plant['name'] for plant in json.load(f)['plants']]
+
+
+def new_plant(name):
+    return {"name": name, "scientific_name": "", "image": "", "watering_frequency": "Weekly",
+            "watering_times": ["Morning"], "sunlight": "", "soil": "", "fertilizer": "",
+            "growth_type": "", "care_tips": ""}
+
+
+def test_index_failure_after_the_write_writes_once(tmp_path):
+    path = str(tmp_path / 'plants.json')
+    store = PlantStore(JsonStorage(path), WINDOW)
+    index = FailingIndex()
+    store.add_index(index)
+    store.refresh()
+    outcomes = submit_together(store._commits, [
+        [{"op": "add", "plant": new_plant('good')}],
+        [{"op": "add", "plant": new_plant('bad')}],
+    ])
+    assert all(isinstance(outcome, list) for outcome in outcomes)
+    assert sorted(stored_names(path)) == ['bad', 'good']
+    # The next read reloads and rebuilds the index that fell behind
+    rebuilds = index.rebuilds
+    store.refresh()
+    assert index.rebuilds == rebuilds + 1
+    assert index.names == {'good', 'bad'}
+
+
+def test_bad_operation_fails_alone_in_a_store(tmp_path):
+    path = str(tmp_path / 'plants.json')
+    store = PlantStore(JsonStorage(path), WINDOW)
+    store.refresh()
+    outcomes = submit_together(store._commits, [
+        [{"op": "add", "plant": new_plant('good')}],
+        [{"op": "rename", "id": 1}],
+    ])
+    assert isinstance(outcomes[0], list)
+    assert isinstance(outcomes[1], ValueError)
+    assert stored_names(path) == ['good']
+
+
+class FailingGardenIndex:
+    """Garden index that can't take plant 2 incrementally"""
+
+    def __init__(self):
+        self.rebuilds = 0
+
+    def rebuild(self, entries):
+        self.rebuilds += 1
+
+    def apply(self, event, entry):
+        if entry['id'] == 2:
+            raise RuntimeError("index failed")
+
+
+def test_garden_index_failure_after_the_write_writes_once(tmp_path):
+    path = str(tmp_path / 'garden.json')
+    garden = Garden('test', JsonStorage(path, kind='garden'), WINDOW)
+    index = FailingGardenIndex()
+    garden.add_index('failing', index)
+    garden.refresh()
+    outcomes = submit_together(garden._commits, [[{"op": "save", "id": 1}], [{"op": "save", "id": 2}]])
+    assert all(isinstance(outcome, list) for outcome in outcomes)
+    with open(path) as f:
+        stored = json.load(f)
+    assert stored['revision'] == 2
+    assert sorted(entry['version'] for entry in stored['plants']) == [1, 1]
+    rebuilds = index.rebuilds
+    garden.refresh()
+    assert index.rebuilds == rebuilds + 1
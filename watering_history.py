@@ -0,0 +1,155 @@
+"""Per-plant watering history kept as one bitmap per watering slot.
+
+Bit N of a slot's bitmap is set when the plant was watered in that slot
+on the Nth day after the history's ``start`` day. A garden entry stores
+it as ``{"start": "YYYY-MM-DD", "morning": hex, "evening": hex}``: two bits
+a day, about 90 bytes a year, and never more than HISTORY_DAYS worth.
+Aggregates over any window come from a few shifts, masks and popcounts on
+those ints rather than a walk over individual waterings.
+"""
+from datetime import date, timedelta
+
+from facets import popcount
+
+SLOTS = ('morning', 'evening')
+
+# Days of history kept per plant; older days are shifted out
+HISTORY_DAYS = 3 * 366
+
+# Catalog watering_times labels for each slot
+SLOT_LABELS = {'morning': 'Morning', 'evening': 'Evening'}
+
+
+def new_history(day):
+    return {"start": day, "morning": "0", "evening": "0"}
+
+
+def seed_history(entry):
+    """Start a history for an entry from before histories were kept.
+
+    All that survives of its waterings is the last watering day's status.
+    """
+    if 'history' in entry or not entry.get('watering_day'):
+        return
+    for slot in SLOTS:
+        if entry['watering_status'].get(slot):
+            record_watering(entry, entry['watering_day'], slot)
+
+
+def record_watering(entry, day, slot):
+    """Set ``slot`` on ``day`` (an ISO date) in the entry's history"""
+    history = entry.get('history')
+    if history is None:
+        history = entry['history'] = new_history(day)
+    start = date.fromisoformat(history['start'])
+    offset = (date.fromisoformat(day) - start).days
+    if offset < 0:
+        # Clock went backwards; start the history earlier
+        for name in SLOTS:
+            history[name] = format(int(history[name], 16) << -offset, 'x')
+        history['start'] = day
+        offset = 0
+    elif offset >= HISTORY_DAYS:
+        drop = offset - HISTORY_DAYS + 1
+        for name in SLOTS:
+            history[name] = format(int(history[name], 16) >> drop, 'x')
+        history['start'] = (start + timedelta(days=drop)).isoformat()
+        offset -= drop
+    history[slot] = format(int(history[slot], 16) | (1 << offset), 'x')
+
+
+def required_slots(plant):
+    """Slots the catalog says the plant is watered in"""
+    times = plant.get('watering_times') or []
+    return [slot for slot in SLOTS if SLOT_LABELS[slot] in times]
+
+
+def longest_run(bits):
+    """Length of the longest run of set bits"""
+    run = 0
+    while bits:
+        bits &= bits >> 1
+        run += 1
+    return run
+
+
+def set_days(bits, first):
+    """ISO dates of the set bits, bit 0 being ``first``"""
+    days = []
+    while bits:
+        low = bits & -bits
+        days.append((first + timedelta(days=low.bit_length() - 1)).isoformat())
+        bits ^= low
+    return days
+
+
+class HistoryWindow:
+    """One entry's history cut down to the days ``first`` to ``last``.
+
+    Days before the history started (when the plant was first saved or
+    watered) are left out, so they never count as missed. Bit 0 of every
+    bitmap is the window's first tracked day.
+    """
+
+    def __init__(self, entry, slots, first, last):
+        self.slots = slots or list(SLOTS)
+        history = entry.get('history')
+        if history is None:
+            self.first, self.days = first, 0
+            self.bits = {slot: 0 for slot in SLOTS}
+            return
+        start = date.fromisoformat(history['start'])
+        self.first = max(first, start)
+        self.days = max((last - self.first).days + 1, 0)
+        shift = (self.first - start).days
+        mask = (1 << self.days) - 1
+        self.bits = {slot: (int(history[slot], 16) >> shift) & mask for slot in SLOTS}
+
+    def complete(self):
+        """Bitmap of days on which every required slot was watered"""
+        bits = (1 << self.days) - 1
+        for slot in self.slots:
+            bits &= self.bits[slot]
+        return bits
+
+    def _settled(self, today):
+        """Complete-day bitmap and day count up to today, leaving out today while it is unfinished"""
+        bits, days = self.complete(), self.days
+        # Days after today haven't happened yet, so can't have been missed
+        days = min(days, max((today - self.first).days + 1, 0))
+        bits &= (1 << days) - 1
+        last_day = self.first + timedelta(days=days - 1)
+        if days and last_day == today and not bits >> (days - 1) & 1:
+            days -= 1
+            bits &= (1 << days) - 1
+        return bits, days
+
+    def current_streak(self, today):
+        """Complete days in a row up to the window's last day"""
+        bits, days = self._settled(today)
+        missing = ~bits & ((1 << days) - 1)
+        return days - missing.bit_length()
+
+    def stats(self, today):
+        """Counts, adherence and streaks over the window.
+
+        Adherence is the share of required waterings done. An unfinished
+        today, or a day still to come, counts towards neither it nor the
+        missed days.
+        """
+        waterings = {slot: popcount(self.bits[slot]) for slot in SLOTS}
+        complete, settled_days = self._settled(today)
+        settled = (1 << settled_days) - 1
+        done = sum(popcount(self.bits[slot] & settled) for slot in self.slots)
+        expected = settled_days * len(self.slots)
+        return {
+            "tracked_days": self.days,
+            "waterings": waterings,
+            "days_watered": popcount(self.bits['morning'] | self.bits['evening']),
+            "done": done,
+            "expected": expected,
+            "adherence": round(done / expected, 3) if expected else None,
+            "missed_days": settled_days - popcount(complete),
+            "current_streak": self.current_streak(today),
+            "longest_streak": longest_run(complete),
+        }